@@ -1,8 +1,18 @@
 import frappe
+import hashlib
 import json
+from datetime import datetime, timezone
 from frappe import _
-from frappe.utils import now_datetime, flt
+from frappe.utils import now_datetime, flt, get_datetime, convert_utc_to_system_timezone
 from cold_storage.cold_storage import utils
+from cold_storage.cold_storage.sensor_queue import push_readings
+from cold_storage.cold_storage.environment_alerts import evaluate_alerts
+from cold_storage.cold_storage.doctype.cold_storage_environment_rollup.cold_storage_environment_rollup import update_rollups
+from cold_storage.cold_storage.doctype.cold_storage_environment_sensor.cold_storage_environment_sensor import (
+    get_sensors, clear_sensor_registry, publish_latest_readings
+)
+
+MAX_BATCH_SIZE = 1000
 
 @frappe.whitelist(allow_guest=True)
 def record_sensor_data():
@@ -27,82 +37,198 @@ def record_sensor_data():
     except Exception:
         frappe.throw(_("Invalid JSON payload"), frappe.ValidationError)
 
-    if not data or not data.get("device_id"):
+    if not isinstance(data, dict) or not data.get("device_id"):
         return {"status": "error", "message": "Missing device_id"}
 
-    device_id = data.get("device_id")
-    values = data.get("values", {})
-    battery = data.get("battery")
-
-    # Find sensor
-    sensor_name = frappe.db.get_value("Cold Storage Environment Sensor", {"sensor_id": device_id}, "name")
-    
-    if not sensor_name:
-        # Auto-create sensor if not exists? Maybe later. For now, log error.
-        frappe.log_error("IoT Alert", f"Record received for unknown sensor ID: {device_id}")
-        return {"status": "error", "message": f"Sensor {device_id} not registered"}
-
-    sensor = frappe.get_doc("Cold Storage Environment Sensor", sensor_name)
-    
-    # Record reading
-    reading = frappe.get_doc({
-        "doctype": "Cold Storage Environment Reading",
-        "sensor": sensor.name,
-        "timestamp": now_datetime(),
+    push_readings([data])
+    return accepted({"status": "queued"})
+
+@frappe.whitelist(allow_guest=True)
+def record_sensor_data_batch():
+    """
+    Batch webhook for gateways that buffer readings. Accepts a list of
+    readings (or {"readings": [...]}) across any number of devices, each
+    in the record_sensor_data format plus an optional device "timestamp"
+    (ISO datetime or Unix epoch seconds/milliseconds):
+    [
+        {"device_id": "EUI-12345678", "timestamp": 1760000000, "values": {...}, "battery": 85},
+        ...
+    ]
+    """
+    if frappe.request.method != "POST":
+        frappe.throw(_("Connect with POST"), frappe.PermissionError)
+
+    try:
+        data = frappe.request.get_json()
+    except Exception:
+        frappe.throw(_("Invalid JSON payload"), frappe.ValidationError)
+
+    if isinstance(data, dict):
+        data = data.get("readings")
+
+    if not isinstance(data, list) or not data:
+        return {"status": "error", "message": "Missing readings"}
+
+    if len(data) > MAX_BATCH_SIZE:
+        return {"status": "error", "message": f"Too many readings, send at most {MAX_BATCH_SIZE} per request"}
+
+    readings = [r for r in data if isinstance(r, dict) and r.get("device_id")]
+    if readings:
+        push_readings(readings)
+    return accepted({"status": "queued", "queued": len(readings), "rejected": len(data) - len(readings)})
+
+def accepted(response):
+    """Respond 202: readings are persisted by the sensor queue drainer"""
+    frappe.local.response.http_status_code = 202
+    return response
+
+def save_readings(entries):
+    """
+    Persist readings for many sensors at once: sensors are resolved from
+    the cached registry, readings go in with one multi-row insert and are
+    folded into the rollups, each sensor's latest state is updated once,
+    then a single commit.
+    Called by the sensor queue drainer (see sensor_queue.drain_sensor_queue).
+    """
+    received_at = now_datetime()
+    readings = []
+    invalid = 0
+    for entry in entries:
+        reading = parse_reading(entry, received_at)
+        if reading:
+            readings.append(reading)
+        else:
+            invalid += 1
+
+    sensors, unknown_sensors = get_sensors({r.device_id for r in readings})
+
+    readings = drop_saved_readings([r for r in readings if r.device_id in sensors])
+    if not readings:
+        return {"readings": [], "invalid": invalid, "unknown_sensors": unknown_sensors}
+
+    user = frappe.session.user
+    values = []
+    latest = {}
+    for r in readings:
+        r.sensor = sensors[r.device_id].name
+        values.append((
+            r.name, received_at, received_at, user, user, 0,
+            r.sensor, r.timestamp, r.temperature, r.humidity, r.co2
+        ))
+
+        if r.sensor not in latest or r.timestamp >= latest[r.sensor].timestamp:
+            latest[r.sensor] = r
+
+    sensors_by_name = {sensor.name: sensor for sensor in sensors.values() if sensor.name in latest}
+
+    frappe.db.bulk_insert("Cold Storage Environment Reading",
+        fields=["name", "creation", "modified", "owner", "modified_by", "docstatus",
+            "sensor", "timestamp", "temperature", "humidity", "co2"],
+        values=values,
+        ignore_duplicates=True
+    )
+    update_rollups(readings, sensors_by_name)
+
+    # Check Alerts
+    statuses = evaluate_alerts(sensors_by_name, readings)
+
+    status_changed = False
+    for sensor in sensors_by_name.values():
+        reading = latest.get(sensor.name)
+        if not reading:
+            continue
+
+        # Device timestamps may arrive out of order; never move last_reading back
+        frappe.db.sql("""
+            UPDATE `tabCold Storage Environment Sensor`
+            SET status = %(status)s,
+                battery_percentage = IFNULL(%(battery)s, battery_percentage),
+                last_reading = GREATEST(IFNULL(last_reading, %(timestamp)s), %(timestamp)s),
+                modified = %(modified)s
+            WHERE name = %(name)s
+        """, {
+            "name": sensor.name,
+            "status": statuses[sensor.name],
+            "battery": reading.battery,
+            "timestamp": reading.timestamp,
+            "modified": received_at
+        })
+        status_changed = status_changed or statuses[sensor.name] != sensor.status
+
+    frappe.db.commit()
+
+    publish_latest_readings(sensors_by_name, latest, statuses)
+    if status_changed:
+        clear_sensor_registry()
+
+    return {"readings": [r.name for r in readings], "invalid": invalid, "unknown_sensors": unknown_sensors}
+
+def drop_saved_readings(readings):
+    """
+    Name each reading after its content and drop the ones already saved (or
+    repeated in the batch), so a chunk the sensor queue delivers twice is
+    neither inserted nor rolled up twice
+    """
+    unique = {}
+    for r in readings:
+        r.name = get_reading_name(r)
+        unique.setdefault(r.name, r)
+
+    if not unique:
+        return []
+
+    saved = set(frappe.get_all("Cold Storage Environment Reading",
+        filters={"name": ["in", list(unique)]},
+        pluck="name"
+    ))
+    return [r for name, r in unique.items() if name not in saved]
+
+def get_reading_name(reading):
+    """Deterministic name from the device, timestamp and values of a reading"""
+    key = json.dumps([reading.device_id, str(reading.timestamp),
+        reading.temperature, reading.humidity, reading.co2])
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+def parse_reading(entry, received_at=None):
+    """Normalise one webhook reading, returning None if it is unusable"""
+    if not isinstance(entry, dict) or not entry.get("device_id"):
+        return None
+
+    values = entry.get("values") or {}
+    if not isinstance(values, dict):
+        return None
+
+    try:
+        # Fall back to the time the webhook queued it, then to now
+        if entry.get("received_at"):
+            received_at = get_datetime(entry.get("received_at"))
+        timestamp = get_reading_timestamp(entry.get("timestamp"), received_at or now_datetime())
+    except Exception:
+        return None
+
+    battery = entry.get("battery")
+    return frappe._dict({
+        "device_id": str(entry.get("device_id")),
+        "timestamp": timestamp,
         "temperature": flt(values.get("temperature")),
         "humidity": flt(values.get("humidity")),
-        "co2": flt(values.get("co2"))
+        "co2": flt(values.get("co2")),
+        "battery": flt(battery) if battery is not None else None
     })
-    reading.insert(ignore_permissions=True)
 
-    # Update sensor status
-    sensor.battery_percentage = flt(battery)
-    sensor.last_reading = reading.timestamp
-    sensor.status = "Online"
-    
-    # Check Alerts
-    check_thresholds_and_alert(sensor, reading)
-    
-    sensor.save(ignore_permissions=True)
-    frappe.db.commit()
+def get_reading_timestamp(value, default):
+    """Device timestamp as a naive datetime in the system timezone"""
+    if value in (None, ""):
+        return default
+
+    if isinstance(value, (int, float)):
+        # Epoch in milliseconds if it is too large to be seconds
+        if value > 1e11:
+            value = value / 1000
+        timestamp = datetime.fromtimestamp(value, tz=timezone.utc)
+    else:
+        timestamp = get_datetime(value)
 
-    return {"status": "success", "reading": reading.name}
-
-def check_thresholds_and_alert(sensor, reading):
-    alerts = []
-    
-    # Temperature
-    if sensor.temperature_limit_high and reading.temperature > sensor.temperature_limit_high:
-        alerts.append(f"🌡 High Temperature: {reading.temperature}°C (Limit: {sensor.temperature_limit_high}°C)")
-    elif sensor.temperature_limit_low and reading.temperature < sensor.temperature_limit_low:
-        alerts.append(f"❄ Low Temperature: {reading.temperature}°C (Limit: {sensor.temperature_limit_low}°C)")
-        
-    # Humidity
-    if sensor.humidity_limit_high and reading.humidity > sensor.humidity_limit_high:
-        alerts.append(f"💧 High Humidity: {reading.humidity}% (Limit: {sensor.humidity_limit_high}%)")
-        
-    # CO2
-    if sensor.co2_limit_high and reading.co2 > sensor.co2_limit_high:
-        alerts.append(f"🌫 High CO2: {reading.co2} ppm (Limit: {sensor.co2_limit_high} ppm)")
-
-    if alerts:
-        sensor.status = "Alarm"
-        
-        # Construct Alert Message
-        message = f"🚨 *Environment Alert: {sensor.sensor_name}*\n"
-        message += f"Warehouse: {sensor.warehouse or 'Unknown'}\n\n"
-        for a in alerts:
-            message += f"• {a}\n"
-        message += f"\nTime: {frappe.utils.format_datetime(reading.timestamp)}\n"
-        message += f"\n_Please check the cold room immediately._"
-        
-        # Send to Managers (Assuming we send to same Daily Summary recipients or defined on sensor)
-        # For now, let's fetch from WhatsApp Settings
-        wa_settings = frappe.get_single("Cold Storage WhatsApp Settings")
-        if wa_settings.enabled and wa_settings.summary_recipients:
-            recipients = [r.strip() for r in wa_settings.summary_recipients.split('\n') if r.strip()]
-            for number in recipients:
-                utils.send_whatsapp(number, message)
-        
-        # Log Alert
-        frappe.log_error(f"Environmental Alarm: {sensor.sensor_name}", message)
+    if timestamp.tzinfo:
+        timestamp = convert_utc_to_system_timezone(timestamp).replace(tzinfo=None)
+    return timestamp
@@ -4,19 +4,32 @@
 import frappe
 from frappe import _
 
+# Rendered statements are cached under a per-customer version, which is
+# replaced whenever the customer's receipts, dispatches, invoices or payments change
+STATEMENT_CACHE_TTL = 3600
+STATEMENT_LANGS = ("en", "ur")
+MAX_STATEMENT_PAGE_LENGTH = 500
+
+
 @frappe.whitelist()
-def get_customer_statement(customer=None, from_date=None, to_date=None, format="json", lang="en"):
+def get_customer_statement(customer=None, from_date=None, to_date=None, format="json", lang="en",
+        cursor=None, page_length=None):
     """
     Get customer stock statement for portal download.
     Format can be 'json', 'pdf', or 'xlsx'
     Lang can be 'en' (English) or 'ur' (Urdu)
+    For 'json', pass page_length (and then next_cursor as cursor) to page through line items
     """
-    if lang:
-        frappe.local.lang = lang
-    
-    # Force clear cache for this request to ensure fresh code/data
-    frappe.clear_cache()
-    
+    from frappe.utils import add_days, cint, getdate, today
+
+    lang = lang or "en"
+    if lang not in STATEMENT_LANGS:
+        frappe.throw(_("Invalid language. Use 'en' or 'ur'"))
+    frappe.local.lang = lang
+
+    if format not in ("json", "xlsx", "pdf"):
+        frappe.throw(_("Invalid format. Use 'json', 'xlsx', or 'pdf'"))
+
     frappe.logger().debug(f"Generating statement for {customer} (format: {format}, lang: {lang})")
 
     # Validate customer access
@@ -30,26 +43,68 @@ def get_customer_statement(customer=None, from_date=None, to_date=None, format="
     if not can_access_customer(customer):
         frappe.throw(_("You do not have access to this customer's data"))
     
-    from frappe.utils import today, add_days
     # Default date range: last 1 year
-    if not from_date:
-        from_date = add_days(today(), -365)
-    if not to_date:
-        to_date = today()
-    
-    # Get statement data
-    data = get_statement_data(customer, from_date, to_date)
-    
+    try:
+        from_date = getdate(from_date or add_days(today(), -365))
+        to_date = getdate(to_date or today())
+    except Exception:
+        frappe.throw(_("Invalid date. Use YYYY-MM-DD"))
+    if from_date > to_date:
+        frappe.throw(_("From Date cannot be after To Date"))
+
+    # Paging applies to JSON only; normalised so each page has one cache entry
+    page_length = min(max(cint(page_length), 0), MAX_STATEMENT_PAGE_LENGTH) if format == "json" else 0
+    cursor = encode_statement_cursor(*decode_statement_cursor(cursor)) if cursor and page_length else None
+
+    # Get statement data (the rendered file for PDF), from the cache when possible
+    cache_key = get_statement_cache_key(customer, today(), from_date, to_date, lang, format, cursor, page_length)
+    cached = frappe.cache.get_value(cache_key)
+
+    if format == "pdf":
+        if cached is None:
+            cached = render_pdf(get_statement_data(customer, from_date, to_date), customer, from_date, to_date, lang)
+            frappe.cache.set_value(cache_key, cached, expires_in_sec=STATEMENT_CACHE_TTL)
+        send_pdf(cached, customer)
+        return
+
+    data = cached
+    if data is None:
+        data = get_statement_data(customer, from_date, to_date, cursor, page_length)
+        frappe.cache.set_value(cache_key, data, expires_in_sec=STATEMENT_CACHE_TTL)
+
     if format == "json":
         return data
-    elif format == "xlsx":
-        generate_excel(data, customer, from_date, to_date)
-        return
-    elif format == "pdf":
-        generate_pdf(data, customer, from_date, to_date, lang)
+
+    generate_excel(data, customer, from_date, to_date)
+
+
+def get_statement_version_key(customer):
+    return f"cold_storage_customer_statement_version:{customer}"
+
+
+def get_statement_cache_key(customer, *parts):
+    """Cache key of one rendered statement; entries of older versions just expire"""
+    version = frappe.cache.get_value(get_statement_version_key(customer)) or ""
+    return ":".join(["cold_storage_customer_statement", customer, version, *(str(p or "") for p in parts)])
+
+
+def clear_customer_statement_cache(doc, method=None):
+    """doc_events hook: drop the cached statements of the customer a document belongs to"""
+    customer = doc.get("customer")
+    if doc.doctype == "Payment Entry":
+        customer = doc.party if doc.party_type == "Customer" else None
+
+    if not customer:
         return
-    else:
-        frappe.throw(_("Invalid format. Use 'json', 'xlsx', or 'pdf'"))
+
+    version_key = get_statement_version_key(customer)
+
+    def bump_version():
+        frappe.cache.set_value(version_key, frappe.generate_hash(length=8))
+
+    bump_version()
+    # Again after commit, in case a download cached the old figures meanwhile
+    frappe.db.after_commit.add(bump_version)
 
 
 def get_customer_for_user():
@@ -92,61 +147,141 @@ def can_access_customer(customer):
     return user_customer == customer
 
 
-def get_statement_data(customer, from_date, to_date):
-    """Get detailed stock statement for a customer using optimized JOINs"""
-    from frappe.utils import flt, getdate, today
-    
-    # Get all receipt items with dispatched quantities in one go
-    # Using more robust SELECT to avoid SQL mode issues
-    data = frappe.db.sql("""
-        SELECT 
-            r.name as receipt,
-            r.receipt_date,
-            r.warehouse,
-            ri.goods_item as item,
-            ri.item_group,
-            ri.batch_no,
-            ri.number_of_bags as received_qty,
-            (SELECT COALESCE(SUM(di.number_of_bags), 0) 
-             FROM `tabCold Storage Dispatch Item` di 
-             JOIN `tabCold Storage Dispatch` d ON d.name = di.parent
-             WHERE di.linked_receipt = r.name 
-             AND di.batch_no = ri.batch_no
-             AND d.docstatus = 1) as dispatched_qty
-        FROM `tabCold Storage Receipt` r
-        JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
-        WHERE r.customer = %s 
-        AND r.docstatus = 1
-        AND r.receipt_date BETWEEN %s AND %s
-        ORDER BY r.receipt_date DESC, r.name
-    """, (customer, from_date, to_date), as_dict=True)
-    
-    # Calculate balances and days in store
-    total_received = 0
-    total_dispatched = 0
-    today_date = getdate(today())
-    
+def get_statement_data(customer, from_date, to_date, cursor=None, page_length=None):
+    """
+    Get detailed stock statement for a customer in a single query.
+    Dispatched bags are summed once per (linked_receipt, batch_no) in a derived
+    table and joined in; summary totals and days in store come from the same
+    query. With page_length, line items are returned one page at a time in
+    statement order, and next_cursor fetches the following page.
+    """
+    from frappe.utils import cint, flt, today
+
+    page_length = min(max(cint(page_length), 0), MAX_STATEMENT_PAGE_LENGTH)
+    values = {
+        "customer": customer,
+        "from_date": from_date,
+        "to_date": to_date,
+        "today": today(),
+        "page_length": page_length
+    }
+
+    cursor_condition = ""
+    if cursor:
+        values["cursor_date"], values["cursor_receipt"], values["cursor_idx"] = decode_statement_cursor(cursor)
+        cursor_condition = """
+            AND (receipt_date < %(cursor_date)s
+                OR (receipt_date = %(cursor_date)s AND (receipt > %(cursor_receipt)s
+                    OR (receipt = %(cursor_receipt)s AND idx > %(cursor_idx)s))))
+        """
+
+    rows = frappe.db.sql(f"""
+        WITH receipt_lines AS (
+            SELECT
+                r.name as receipt,
+                r.receipt_date,
+                r.warehouse,
+                ri.goods_item as item,
+                ri.item_group,
+                ri.batch_no,
+                ri.idx,
+                ri.number_of_bags as received_qty,
+                IFNULL(dq.qty, 0) as dispatched_qty,
+                ri.number_of_bags - IFNULL(dq.qty, 0) as balance_qty,
+                DATEDIFF(%(today)s, r.receipt_date) as days_in_store
+            FROM `tabCold Storage Receipt` r
+            JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
+            LEFT JOIN (
+                SELECT di.linked_receipt, IFNULL(di.batch_no, '') as batch_no, SUM(di.number_of_bags) as qty
+                FROM `tabCold Storage Dispatch Item` di
+                JOIN `tabCold Storage Dispatch` d ON d.name = di.parent
+                JOIN `tabCold Storage Receipt` lr ON lr.name = di.linked_receipt
+                WHERE d.docstatus = 1
+                AND lr.customer = %(customer)s
+                AND lr.docstatus = 1
+                AND lr.receipt_date BETWEEN %(from_date)s AND %(to_date)s
+                GROUP BY di.linked_receipt, IFNULL(di.batch_no, '')
+            ) dq ON dq.linked_receipt = r.name AND dq.batch_no = IFNULL(ri.batch_no, '')
+            WHERE r.customer = %(customer)s
+            AND r.docstatus = 1
+            AND r.receipt_date BETWEEN %(from_date)s AND %(to_date)s
+        )
+        SELECT t.total_received, t.total_dispatched, t.total_lines, l.*
+        FROM (
+            SELECT
+                IFNULL(SUM(received_qty), 0) as total_received,
+                IFNULL(SUM(dispatched_qty), 0) as total_dispatched,
+                COUNT(*) as total_lines
+            FROM receipt_lines
+        ) t
+        LEFT JOIN (
+            SELECT * FROM receipt_lines
+            WHERE 1 = 1 {cursor_condition}
+            ORDER BY receipt_date DESC, receipt, idx
+            {"LIMIT %(page_length)s" if page_length else ""}
+        ) l ON 1 = 1
+        ORDER BY l.receipt_date DESC, l.receipt, l.idx
+    """, values, as_dict=True)
+
+    totals = rows[0]
     results = []
-    for row in data:
-        row["balance_qty"] = flt(row["received_qty"]) - flt(row["dispatched_qty"])
-        row["days_in_store"] = (today_date - getdate(row["receipt_date"])).days
-        total_received += flt(row["received_qty"])
-        total_dispatched += flt(row["dispatched_qty"])
+    for row in rows:
+        if row.receipt is None:
+            continue
+        for key in ("total_received", "total_dispatched", "total_lines"):
+            row.pop(key)
         results.append(row)
-    
-    return {
+
+    next_cursor = None
+    if page_length and len(results) == page_length:
+        last = results[-1]
+        next_cursor = encode_statement_cursor(last.receipt_date, last.receipt, last.idx)
+
+    for row in results:
+        row.pop("idx")
+
+    data = {
         "customer": customer,
         "from_date": str(from_date),
         "to_date": str(to_date),
         "generated_on": today(),
         "summary": {
-            "total_received": total_received,
-            "total_dispatched": total_dispatched,
-            "total_balance": total_received - total_dispatched
+            "total_received": flt(totals.total_received),
+            "total_dispatched": flt(totals.total_dispatched),
+            "total_balance": flt(totals.total_received) - flt(totals.total_dispatched)
         },
         "line_items": results
     }
 
+    if page_length:
+        data["total_lines"] = cint(totals.total_lines)
+        data["next_cursor"] = next_cursor
+
+    return data
+
+
+def encode_statement_cursor(receipt_date, receipt, idx):
+    """Opaque cursor of the last line on a page"""
+    import base64
+
+    return base64.urlsafe_b64encode(frappe.as_json([str(receipt_date), receipt, idx], indent=None).encode()).decode()
+
+
+def decode_statement_cursor(cursor):
+    """(receipt_date, receipt, idx) of a cursor, checked so no crafted value reaches the query"""
+    import base64
+    import json
+    from frappe.utils import getdate
+
+    try:
+        receipt_date, receipt, idx = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not (receipt_date and isinstance(receipt_date, str) and isinstance(receipt, str)
+                and isinstance(idx, int) and not isinstance(idx, bool)):
+            raise ValueError
+        return getdate(receipt_date), str(receipt), int(idx)
+    except Exception:
+        frappe.throw(_("Invalid cursor"))
+
 
 def generate_excel(data, customer, from_date, to_date):
     """Generate Excel file for statement. Uses 'line_items' key."""
@@ -221,6 +356,11 @@ def generate_excel(data, customer, from_date, to_date):
 
 def generate_pdf(data, customer, from_date, to_date, lang="en"):
     """Generate PDF statement using Frappe's PDF generator"""
+    send_pdf(render_pdf(data, customer, from_date, to_date, lang), customer)
+
+
+def render_pdf(data, customer, from_date, to_date, lang="en"):
+    """Render the PDF statement and return its bytes"""
     from frappe.utils import today
     
     translations = {
@@ -321,8 +461,12 @@ def generate_pdf(data, customer, from_date, to_date, lang="en"):
     )
     
     from frappe.utils.pdf import get_pdf
-    pdf = get_pdf(html)
-    
+    return get_pdf(html)
+
+
+def send_pdf(pdf, customer):
+    from frappe.utils import today
+
     frappe.response["filename"] = f"Stock_Statement_{customer}_{today()}.pdf"
     frappe.response["filecontent"] = pdf
     frappe.response["type"] = "download"
@@ -0,0 +1,2 @@
+# Copyright (c) 2026, Cold Storage and contributors
+# License: MIT. See LICENSE
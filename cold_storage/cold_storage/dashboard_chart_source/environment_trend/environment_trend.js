@@ -0,0 +1,34 @@
+frappe.provide("frappe.dashboards.chart_sources");
+
+frappe.dashboards.chart_sources["Environment Trend"] = {
+    method: "cold_storage.cold_storage.dashboard_chart_source.environment_trend.environment_trend.get",
+    filters: [
+        {
+            fieldname: "metric",
+            label: __("Metric"),
+            fieldtype: "Select",
+            options: "temperature\nhumidity\nco2",
+            default: "temperature",
+            reqd: 1,
+        },
+        {
+            fieldname: "timespan",
+            label: __("Timespan"),
+            fieldtype: "Select",
+            options: "Last 6 Hours\nLast Day\nLast Week\nLast Month\nLast Quarter\nLast Year",
+            default: "Last Week",
+        },
+        {
+            fieldname: "warehouse",
+            label: __("Warehouse"),
+            fieldtype: "Link",
+            options: "Warehouse",
+        },
+        {
+            fieldname: "sensor",
+            label: __("Sensor"),
+            fieldtype: "Link",
+            options: "Cold Storage Environment Sensor",
+        },
+    ],
+};
@@ -0,0 +1,68 @@
+# Copyright (c) 2026, Cold Storage and contributors
+# License: MIT. See LICENSE
+
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, now_datetime
+from frappe.utils.dashboard import cache_source
+
+from cold_storage.cold_storage.doctype.cold_storage_environment_rollup.cold_storage_environment_rollup import (
+	get_environment_trend,
+)
+
+CHART_POINTS = 300
+
+TIMESPANS = {
+	"Last 6 Hours": {"hours": -6},
+	"Last Day": {"days": -1},
+	"Last Week": {"weeks": -1},
+	"Last Month": {"months": -1},
+	"Last Quarter": {"months": -3},
+	"Last Year": {"years": -1},
+}
+
+METRIC_LABELS = {
+	"temperature": _("Temperature (°C)"),
+	"humidity": _("Humidity (%)"),
+	"co2": _("CO2 (ppm)"),
+}
+
+
+@frappe.whitelist()
+@cache_source
+def get(
+	chart_name=None,
+	chart=None,
+	no_cache=None,
+	filters=None,
+	from_date=None,
+	to_date=None,
+	timespan=None,
+	time_interval=None,
+	heatmap_year=None,
+):
+	"""
+	Returns an environment metric trend for the selected timespan, downsampled
+	to CHART_POINTS by get_environment_trend.
+	Format: { "labels": [...], "datasets": [{ "values": [...] }, ...] }
+	"""
+	filters = frappe.parse_json(filters) or {}
+	metric = filters.get("metric") or "temperature"
+
+	to_datetime = now_datetime()
+	from_datetime = add_to_date(to_datetime, **TIMESPANS.get(filters.get("timespan"), TIMESPANS["Last Week"]))
+
+	trend = get_environment_trend(
+		metric, from_datetime, to_datetime,
+		sensor=filters.get("sensor"), warehouse=filters.get("warehouse"), max_points=CHART_POINTS
+	)
+
+	return {
+		"labels": trend["labels"],
+		"datasets": [
+			{"name": METRIC_LABELS.get(metric, metric), "values": trend["avg"]},
+			{"name": _("Min"), "values": trend["min"]},
+			{"name": _("Max"), "values": trend["max"]},
+		],
+		"type": "line",
+	}
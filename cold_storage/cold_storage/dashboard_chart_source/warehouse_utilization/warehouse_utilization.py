@@ -6,6 +6,11 @@ from frappe import _
 from frappe.utils import flt
 from frappe.utils.dashboard import cache_source
 
+from cold_storage.cold_storage.utils import get_warehouse_utilization
+
+UTILIZATION_CACHE_KEY = "cold_storage_warehouse_utilization"
+UTILIZATION_CACHE_TTL = 60
+
 
 @frappe.whitelist()
 @cache_source
@@ -24,59 +29,24 @@ def get(
 	Returns data for the Warehouse Utilization dashboard chart.
 	Format: { "labels": [...], "datasets": [{ "values": [...] }] }
 	"""
-	# Get all warehouses with capacity
-	warehouses = frappe.get_all("Warehouse", 
-		fields=["name", "warehouse_name", "total_capacity_bags"],
-		filters={"disabled": 0, "is_group": 0},
-		order_by="warehouse_name"
-	)
-	
-	labels = []
-	values = []
-	
-	for w in warehouses:
-		capacity = flt(w.total_capacity_bags)
-		if capacity <= 0:
-			continue
-			
-		# Calculate current stock (Bags)
-		receipts = frappe.get_all("Cold Storage Receipt", 
-			filters={"docstatus": 1, "warehouse": w.name}, 
-			pluck="name", 
-			ignore_permissions=True
-		)
-		
-		in_bags = 0
-		if receipts:
-			in_items = frappe.get_all("Cold Storage Receipt Item",
-				filters={"parent": ["in", receipts]},
-				fields=["number_of_bags"],
-				ignore_permissions=True
-			)
-			in_bags = sum(flt(item.number_of_bags) for item in in_items)
-			
-		out_items = frappe.get_all("Cold Storage Dispatch Item",
-			filters={"docstatus": 1, "warehouse": w.name},
-			fields=["number_of_bags"],
-			ignore_permissions=True
-		)
-		out_bags = sum(flt(item.number_of_bags) for item in out_items)
-		
-		current_bags = in_bags - out_bags
+	data = get_cached_utilization()
 
-		
-		utilization = (flt(current_bags) / capacity) * 100
-		
-		labels.append(w.warehouse_name)
-		values.append(flt(utilization, 2))
-		
 	return {
-		"labels": labels,
+		"labels": [d["warehouse"] for d in data],
 		"datasets": [
 			{
 				"name": _("Utilization (%)"),
-				"values": values
+				"values": [d["utilization"] for d in data]
 			}
 		],
 		"type": "bar",
 	}
+
+
+def get_cached_utilization():
+	# Short-lived cache so dashboard refreshes across users share one computation
+	data = frappe.cache.get_value(UTILIZATION_CACHE_KEY)
+	if data is None:
+		data = get_warehouse_utilization()
+		frappe.cache.set_value(UTILIZATION_CACHE_KEY, data, expires_in_sec=UTILIZATION_CACHE_TTL)
+	return data
@@ -0,0 +1,145 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now_datetime
+
+class ColdStorageBatchLedger(Document):
+	pass
+
+
+def get_ledger_name(linked_receipt, batch_no):
+	"""Primary key of the ledger row for a (receipt, batch) pair"""
+	return f"{linked_receipt}:{batch_no or ''}"
+
+def get_receipt_scan_cache_key(receipt):
+	"""Cache key of the QR scan view of a receipt, which shows its ledger balances"""
+	return f"cold_storage_receipt_scan:{receipt}"
+
+def clear_receipt_scan_cache(receipts):
+	receipts = [r for r in set(receipts) if r]
+	if receipts:
+		frappe.cache.delete_value([get_receipt_scan_cache_key(r) for r in receipts])
+
+
+def update_ledger_for_receipt(doc, cancel=False):
+	"""Add (or on cancel, remove) the received bags of a Cold Storage Receipt"""
+	entries = {}
+	for item in doc.items:
+		key = get_ledger_name(doc.name, item.batch_no)
+		if key not in entries:
+			entries[key] = frappe._dict({
+				"customer": doc.customer,
+				"warehouse": doc.warehouse,
+				"linked_receipt": doc.name,
+				"batch_no": item.batch_no,
+				"received_qty": 0,
+				"dispatched_qty": 0
+			})
+		entries[key].received_qty += flt(item.number_of_bags)
+
+	apply_ledger_entries(entries, -1 if cancel else 1)
+
+def update_ledger_for_dispatch(doc, cancel=False):
+	"""Add (or on cancel, remove) the dispatched bags of a Cold Storage Dispatch"""
+	entries = {}
+	for item in doc.items:
+		if not item.linked_receipt:
+			continue
+
+		key = get_ledger_name(item.linked_receipt, item.batch_no)
+		if key not in entries:
+			entries[key] = frappe._dict({
+				"customer": doc.customer,
+				"warehouse": item.warehouse,
+				"linked_receipt": item.linked_receipt,
+				"batch_no": item.batch_no,
+				"received_qty": 0,
+				"dispatched_qty": 0
+			})
+		entries[key].dispatched_qty += flt(item.number_of_bags)
+
+	apply_ledger_entries(entries, -1 if cancel else 1)
+
+def apply_ledger_entries(entries, sign=1):
+	"""
+	Upsert ledger rows in a single statement. Runs inside the caller's
+	transaction so the ledger is rolled back together with the document.
+	"""
+	if not entries:
+		return
+
+	now = now_datetime()
+	user = frappe.session.user
+	placeholders = []
+	values = []
+	for name, e in entries.items():
+		received = sign * flt(e.received_qty)
+		dispatched = sign * flt(e.dispatched_qty)
+		placeholders.append("(%s, %s, %s, %s, %s, 0, %s, %s, %s, %s, %s, %s, %s)")
+		values.extend([
+			name, now, now, user, user,
+			e.customer, e.warehouse, e.linked_receipt, e.batch_no,
+			received, dispatched, received - dispatched
+		])
+
+	frappe.db.sql(f"""
+		INSERT INTO `tabCold Storage Batch Ledger`
+			(name, creation, modified, owner, modified_by, docstatus,
+			customer, warehouse, linked_receipt, batch_no,
+			received_qty, dispatched_qty, balance_qty)
+		VALUES {", ".join(placeholders)}
+		ON DUPLICATE KEY UPDATE
+			received_qty = received_qty + VALUES(received_qty),
+			dispatched_qty = dispatched_qty + VALUES(dispatched_qty),
+			balance_qty = balance_qty + VALUES(balance_qty),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+	""", tuple(values))
+
+	if sign < 0:
+		# Drop rows that no longer carry any movement (e.g. cancelled receipts)
+		frappe.db.sql("""
+			DELETE FROM `tabCold Storage Batch Ledger`
+			WHERE name IN %(names)s AND received_qty = 0 AND dispatched_qty = 0
+		""", {"names": tuple(entries.keys())})
+
+	clear_receipt_scan_cache([e.linked_receipt for e in entries.values()])
+
+
+def rebuild_batch_ledger():
+	"""
+	Recompute the whole ledger from submitted Receipts and Dispatches.
+	Usage: bench --site [site] rebuild-batch-ledger
+	"""
+	frappe.db.sql("DELETE FROM `tabCold Storage Batch Ledger`")
+
+	now = now_datetime()
+	frappe.db.sql("""
+		INSERT INTO `tabCold Storage Batch Ledger`
+			(name, creation, modified, owner, modified_by, docstatus,
+			customer, warehouse, linked_receipt, batch_no,
+			received_qty, dispatched_qty, balance_qty)
+		SELECT
+			CONCAT(m.linked_receipt, ':', IFNULL(m.batch_no, '')),
+			%(now)s, %(now)s, %(user)s, %(user)s, 0,
+			MAX(m.customer), MAX(m.warehouse), m.linked_receipt, MAX(m.batch_no),
+			SUM(m.received_qty), SUM(m.dispatched_qty),
+			SUM(m.received_qty) - SUM(m.dispatched_qty)
+		FROM (
+			SELECT r.customer, r.warehouse, r.name as linked_receipt, ri.batch_no,
+				ri.number_of_bags as received_qty, 0 as dispatched_qty
+			FROM `tabCold Storage Receipt` r
+			JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
+			WHERE r.docstatus = 1
+
+			UNION ALL
+
+			SELECT d.customer, di.warehouse, di.linked_receipt, di.batch_no,
+				0 as received_qty, di.number_of_bags as dispatched_qty
+			FROM `tabCold Storage Dispatch` d
+			JOIN `tabCold Storage Dispatch Item` di ON di.parent = d.name
+			WHERE d.docstatus = 1 AND IFNULL(di.linked_receipt, '') != ''
+		) m
+		GROUP BY m.linked_receipt, IFNULL(m.batch_no, '')
+	""", {"now": now, "user": frappe.session.user})
+
+	return frappe.db.count("Cold Storage Batch Ledger")
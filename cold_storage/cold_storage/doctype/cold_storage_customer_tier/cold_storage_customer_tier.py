@@ -1,5 +1,11 @@
 import frappe
 from frappe.model.document import Document
 
+from cold_storage.cold_storage.rate_index import clear_rate_index
+
 class ColdStorageCustomerTier(Document):
-	pass
+	def on_update(self):
+		clear_rate_index()
+
+	def on_trash(self):
+		clear_rate_index()
@@ -0,0 +1,189 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, getdate, now_datetime
+
+COUNTERS = (
+	"intake_bags", "transfer_intake_bags", "outtake_bags", "transfer_outtake_bags",
+	"receipt_count", "dispatch_count", "invoice_count", "billed_amount"
+)
+TRANSFER_RECEIPT_TYPES = ("Customer Transfer", "Warehouse Transfer")
+# Remarks prefix of the dispatches created by transfer receipts
+TRANSFER_DISPATCH_REMARKS = "Auto-generated Transfer"
+
+class ColdStorageDailyStat(Document):
+	pass
+
+
+def get_daily_stat_name(date, company, warehouse, item_group):
+	"""Primary key of the stat row for a (date, company, warehouse, item_group)"""
+	return f"{getdate(date)}:{company or ''}:{warehouse or ''}:{item_group or ''}"
+
+def add_entry(entries, date, company, warehouse, item_group, **counters):
+	key = get_daily_stat_name(date, company, warehouse, item_group)
+	if key not in entries:
+		entries[key] = frappe._dict({
+			"date": getdate(date),
+			"company": company,
+			"warehouse": warehouse,
+			"item_group": item_group,
+			**{c: 0 for c in COUNTERS}
+		})
+	for counter, value in counters.items():
+		entries[key][counter] += flt(value)
+
+
+def update_daily_stat_for_receipt(doc, cancel=False):
+	"""Add (or on cancel, remove) a Cold Storage Receipt's intake"""
+	field = "transfer_intake_bags" if doc.receipt_type in TRANSFER_RECEIPT_TYPES else "intake_bags"
+	entries = {}
+	for i, item in enumerate(doc.items):
+		add_entry(entries, doc.receipt_date, doc.company, doc.warehouse, item.item_group,
+			receipt_count=1 if i == 0 else 0, **{field: item.number_of_bags})
+
+	apply_daily_stat_entries(entries, -1 if cancel else 1)
+
+def update_daily_stat_for_dispatch(doc, cancel=False):
+	"""Add (or on cancel, remove) a Cold Storage Dispatch's outtake"""
+	is_transfer = (doc.remarks or "").startswith(TRANSFER_DISPATCH_REMARKS)
+	field = "transfer_outtake_bags" if is_transfer else "outtake_bags"
+	entries = {}
+	for i, item in enumerate(doc.items):
+		add_entry(entries, doc.dispatch_date, doc.company, item.warehouse, item.item_group,
+			dispatch_count=1 if i == 0 else 0, **{field: item.number_of_bags})
+
+	apply_daily_stat_entries(entries, -1 if cancel else 1)
+
+def update_daily_stat_for_invoice(doc, method=None):
+	"""Sales Invoice on_submit / on_cancel hook: add or remove its billed amount"""
+	entries = {}
+	for i, item in enumerate(doc.items):
+		add_entry(entries, doc.posting_date, doc.company, item.warehouse, item.item_group,
+			invoice_count=1 if i == 0 else 0, billed_amount=item.base_net_amount)
+
+	apply_daily_stat_entries(entries, -1 if method == "on_cancel" else 1)
+
+def apply_daily_stat_entries(entries, sign=1):
+	"""
+	Add the deltas to each stat row in a single upsert, inside the caller's
+	transaction so the stats are rolled back together with the document.
+	"""
+	if not entries:
+		return
+
+	now = now_datetime()
+	user = frappe.session.user
+	row_placeholder = "(" + ", ".join(["%s"] * (9 + len(COUNTERS))) + ")"
+	placeholders = []
+	values = []
+	for name, e in entries.items():
+		placeholders.append(row_placeholder)
+		values.extend([
+			name, now, now, user, user, e.date, e.company, e.warehouse, e.item_group,
+			*(sign * flt(e[c]) for c in COUNTERS)
+		])
+
+	frappe.db.sql(f"""
+		INSERT INTO `tabCold Storage Daily Stat`
+			(name, creation, modified, owner, modified_by,
+			date, company, warehouse, item_group, {", ".join(COUNTERS)})
+		VALUES {", ".join(placeholders)}
+		ON DUPLICATE KEY UPDATE
+			{", ".join(f"{c} = {c} + VALUES({c})" for c in COUNTERS)},
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+	""", tuple(values))
+
+	if sign < 0:
+		# Drop rows left empty by a cancellation
+		frappe.db.sql(f"""
+			DELETE FROM `tabCold Storage Daily Stat`
+			WHERE name IN %(names)s AND {" AND ".join(f"{c} = 0" for c in COUNTERS)}
+		""", {"names": tuple(entries.keys())})
+
+
+def rebuild_daily_stats(from_date=None, to_date=None):
+	"""
+	Recompute the stats of [from_date, to_date] (default: all history) from
+	submitted Receipts, Dispatches and Sales Invoices.
+	Usage: bench --site [site] rebuild-daily-stats [--from-date] [--to-date]
+	"""
+	def get_conditions(field):
+		conditions = []
+		if from_date:
+			conditions.append(f"{field} >= %(from_date)s")
+		if to_date:
+			conditions.append(f"{field} <= %(to_date)s")
+		return " AND ".join(conditions) or "1 = 1"
+
+	values = {
+		"from_date": from_date,
+		"to_date": to_date,
+		"now": now_datetime(),
+		"user": frappe.session.user,
+		"transfer_types": TRANSFER_RECEIPT_TYPES,
+		"transfer_remarks": f"{TRANSFER_DISPATCH_REMARKS}%"
+	}
+
+	frappe.db.sql(f"DELETE FROM `tabCold Storage Daily Stat` WHERE {get_conditions('date')}", values)
+
+	frappe.db.sql(f"""
+		INSERT INTO `tabCold Storage Daily Stat`
+			(name, creation, modified, owner, modified_by,
+			date, company, warehouse, item_group, {", ".join(COUNTERS)})
+		SELECT
+			CONCAT(m.date, ':', IFNULL(m.company, ''), ':', IFNULL(m.warehouse, ''), ':', IFNULL(m.item_group, '')),
+			%(now)s, %(now)s, %(user)s, %(user)s,
+			m.date, MAX(m.company), MAX(m.warehouse), MAX(m.item_group),
+			{", ".join(f"SUM(m.{c})" for c in COUNTERS)}
+		FROM (
+			SELECT r.receipt_date as date, r.company, r.warehouse, ri.item_group,
+				IF(r.receipt_type IN %(transfer_types)s, 0, ri.number_of_bags) as intake_bags,
+				IF(r.receipt_type IN %(transfer_types)s, ri.number_of_bags, 0) as transfer_intake_bags,
+				0 as outtake_bags, 0 as transfer_outtake_bags,
+				IF(ri.idx = 1, 1, 0) as receipt_count, 0 as dispatch_count,
+				0 as invoice_count, 0 as billed_amount
+			FROM `tabCold Storage Receipt` r
+			JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
+			WHERE r.docstatus = 1
+
+			UNION ALL
+
+			SELECT d.dispatch_date, d.company, di.warehouse, di.item_group,
+				0, 0,
+				IF(IFNULL(d.remarks, '') LIKE %(transfer_remarks)s, 0, di.number_of_bags),
+				IF(IFNULL(d.remarks, '') LIKE %(transfer_remarks)s, di.number_of_bags, 0),
+				0, IF(di.idx = 1, 1, 0),
+				0, 0
+			FROM `tabCold Storage Dispatch` d
+			JOIN `tabCold Storage Dispatch Item` di ON di.parent = d.name
+			WHERE d.docstatus = 1
+
+			UNION ALL
+
+			SELECT si.posting_date, si.company, sii.warehouse, sii.item_group,
+				0, 0, 0, 0, 0, 0,
+				IF(sii.idx = 1, 1, 0), sii.base_net_amount
+			FROM `tabSales Invoice` si
+			JOIN `tabSales Invoice Item` sii ON sii.parent = si.name
+			WHERE si.docstatus = 1
+		) m
+		WHERE {get_conditions("m.date")}
+		GROUP BY m.date, IFNULL(m.company, ''), IFNULL(m.warehouse, ''), IFNULL(m.item_group, '')
+	""", values)
+
+	return frappe.db.count("Cold Storage Daily Stat")
+
+
+def get_daily_totals(from_date, to_date, company=None):
+	"""Totals of every counter over [from_date, to_date], optionally for one company"""
+	conditions = "date BETWEEN %(from_date)s AND %(to_date)s"
+	if company:
+		conditions += " AND company = %(company)s"
+
+	totals = frappe.db.sql(f"""
+		SELECT {", ".join(f"SUM({c}) as {c}" for c in COUNTERS)}
+		FROM `tabCold Storage Daily Stat`
+		WHERE {conditions}
+	""", {"from_date": from_date, "to_date": to_date, "company": company}, as_dict=True)[0]
+
+	return frappe._dict({c: flt(totals[c]) for c in COUNTERS})
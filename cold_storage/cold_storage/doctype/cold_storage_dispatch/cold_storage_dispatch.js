@@ -1,3 +1,26 @@
+// Quote rates for the given rows with a single server call
+function update_item_rates(frm, rows) {
+    if (!rows.length) return;
+
+    frappe.call({
+        method: 'cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_bag_rates_bulk',
+        args: {
+            customer: frm.doc.customer,
+            doc_date: frm.doc.dispatch_date,
+            billing_type: frm.doc.billing_type,
+            rows: rows.map((row) => [row.item_group, row.goods_item])
+        },
+        callback: function (r) {
+            let quotes = r.message || {};
+            $.each(rows, function (i, row) {
+                let rates = quotes[`${row.item_group}:${row.goods_item || ''}`] || {};
+                frappe.model.set_value(row.doctype, row.name, 'rate', rates.handling || 0);
+                frappe.model.set_value(row.doctype, row.name, 'loading_rate', rates.loading || 0);
+            });
+        }
+    });
+}
+
 frappe.ui.form.on('Cold Storage Dispatch Item', {
     linked_receipt: function (frm, cdt, cdn) {
         // Clear dependent fields when linked_receipt changes
@@ -36,25 +59,7 @@ frappe.ui.form.on('Cold Storage Dispatch Item', {
 
         var row = locals[cdt][cdn];
         if (row.item_group) {
-            frappe.call({
-                method: 'cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_bag_rates',
-                args: {
-                    item_group: row.item_group,
-                    billing_type: frm.doc.billing_type,
-                    goods_item: row.goods_item,
-                    customer: frm.doc.customer,
-                    doc_date: frm.doc.dispatch_date
-                },
-                callback: function (r) {
-                    if (r.message) {
-                        frappe.model.set_value(cdt, cdn, 'rate', r.message.handling || 0);
-                        frappe.model.set_value(cdt, cdn, 'loading_rate', r.message.loading || 0);
-                    } else {
-                        frappe.model.set_value(cdt, cdn, 'rate', 0);
-                        frappe.model.set_value(cdt, cdn, 'loading_rate', 0);
-                    }
-                }
-            });
+            update_item_rates(frm, [row]);
         }
     },
 
@@ -74,17 +79,25 @@ frappe.ui.form.on('Cold Storage Dispatch Item', {
 
         // Validate against available balance
         if (row.batch_no && row.linked_receipt) {
+            // Rows drawing on the same receipt + batch share one balance
+            let requested = 0;
+            $.each(frm.doc.items || [], function (i, d) {
+                if (d.linked_receipt == row.linked_receipt && d.batch_no == row.batch_no) {
+                    requested += flt(d.number_of_bags);
+                }
+            });
+
             frappe.call({
-                method: 'cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_batch_balance',
+                method: 'cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_batch_balances',
                 args: {
-                    linked_receipt: row.linked_receipt,
-                    batch_no: row.batch_no,
+                    rows: [[row.linked_receipt, row.batch_no]],
                     current_dispatch: frm.doc.name
                 },
                 callback: function (r) {
-                    let available = r.message || 0;
-                    if (row.number_of_bags > available) {
-                        frappe.msgprint(__("Row {0}: Insufficient balance. Available: {1}", [row.idx, available]));
+                    let balances = r.message || {};
+                    let available = balances[`${row.linked_receipt}:${row.batch_no}`] || 0;
+                    if (requested > available) {
+                        frappe.msgprint(__("Row {0}: Insufficient balance. Available: {1}, Requested: {2}", [row.idx, available, requested]));
                         frappe.model.set_value(cdt, cdn, "number_of_bags", ""); // Clear invalid
                     } else {
                         // Valid, Calculate Amount
@@ -250,25 +263,6 @@ frappe.ui.form.on('Cold Storage Dispatch', {
 
     billing_type: function (frm) {
         // Update rates for all items when billing type changes
-        $.each(frm.doc.items || [], function (i, row) {
-            if (row.item_group) {
-                frappe.call({
-                    method: 'cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_bag_rates',
-                    args: {
-                        item_group: row.item_group,
-                        billing_type: frm.doc.billing_type,
-                        goods_item: row.goods_item,
-                        customer: frm.doc.customer,
-                        doc_date: frm.doc.dispatch_date
-                    },
-                    callback: function (r) {
-                        if (r.message) {
-                            frappe.model.set_value(row.doctype, row.name, 'rate', r.message.handling || 0);
-                            frappe.model.set_value(row.doctype, row.name, 'loading_rate', r.message.loading || 0);
-                        }
-                    }
-                });
-            }
-        });
+        update_item_rates(frm, (frm.doc.items || []).filter((row) => row.item_group));
     }
 });
@@ -3,15 +3,26 @@ from frappe.model.document import Document
 from frappe.utils import flt
 
 from cold_storage.cold_storage import utils
+from cold_storage.cold_storage.doctype.cold_storage_batch_ledger.cold_storage_batch_ledger import update_ledger_for_dispatch
+from cold_storage.cold_storage.doctype.cold_storage_warehouse_occupancy.cold_storage_warehouse_occupancy import update_occupancy_for_dispatch
+from cold_storage.cold_storage.doctype.cold_storage_daily_stat.cold_storage_daily_stat import update_daily_stat_for_dispatch
 
 @frappe.whitelist()
 def get_bag_rates(item_group, billing_type, goods_item=None, customer=None, doc_date=None):
 	return utils.get_bag_rates(item_group, billing_type, goods_item, customer, doc_date)
 
+@frappe.whitelist()
+def get_bag_rates_bulk(customer, doc_date, billing_type, rows):
+	return utils.get_bag_rates_bulk(customer, doc_date, billing_type, rows)
+
 @frappe.whitelist()
 def get_batch_balance(linked_receipt, batch_no, current_dispatch=None):
 	return utils.get_batch_balance(linked_receipt, batch_no, current_dispatch)
 
+@frappe.whitelist()
+def get_batch_balances(rows, current_dispatch=None):
+	return utils.get_batch_balances(rows, current_dispatch)
+
 @frappe.whitelist()
 def get_total_batch_balance(customer, warehouse, batch_no):
 	return utils.get_total_batch_balance(customer, warehouse, batch_no)
@@ -73,30 +84,42 @@ class ColdStorageDispatch(Document):
 			if row.number_of_bags <= 0:
 				frappe.throw(f"Row {row.idx}: Number of Bags must be greater than 0")
 
-			# 1. Check if Batch exists in Receipt
-			# Optimized: Using shared balance logic
-			available_qty = get_batch_balance(row.linked_receipt, row.batch_no, self.name)
-			
-			if row.number_of_bags > available_qty:
-				frappe.throw(f"Row {row.idx}: Insufficient balance for Batch {row.batch_no}. Available: {available_qty}, Requested: {row.number_of_bags}")
-		
+		self.validate_batch_balances()
 		self.calculate_billing()
+
+	def validate_batch_balances(self):
+		# Rows drawing on the same (receipt, batch) are added up before comparing
+		requested = {}
+		for row in self.items:
+			key = (row.linked_receipt, row.batch_no)
+			if key not in requested:
+				requested[key] = frappe._dict({"qty": 0, "rows": []})
+			requested[key].qty += flt(row.number_of_bags)
+			requested[key].rows.append(str(row.idx))
+
+		balances = utils.get_batch_balances(list(requested.keys()), self.name)
+
+		for (linked_receipt, batch_no), req in requested.items():
+			available_qty = flt(balances.get(utils.get_ledger_name(linked_receipt, batch_no)))
+			if req.qty > available_qty:
+				frappe.throw(f"Row {', '.join(req.rows)}: Insufficient balance for Batch {batch_no}. Available: {available_qty}, Requested: {req.qty}")
         
 	def calculate_billing(self):
 		total_handling = 0
 		total_loading = 0
 		
 		billing_type = self.billing_type
+
+		# Quote all distinct (item_group, goods_item) pairs in one pass
+		quotes = utils.get_bag_rates_bulk(
+			self.customer,
+			self.dispatch_date,
+			billing_type,
+			[[item.item_group, item.goods_item] for item in self.items]
+		)
 		
 		for item in self.items:
-			# Fetch Rates using the new prioritized lookup
-			found_rates = utils.get_bag_rates(
-				item.item_group, 
-				billing_type, 
-				item.goods_item, 
-				self.customer, 
-				self.dispatch_date
-			)
+			found_rates = quotes[utils.get_rate_key(item.item_group, item.goods_item)]
 			
 			# Fallback or Defaults
 			if not item.rate:
@@ -206,6 +229,9 @@ class ColdStorageDispatch(Document):
 			frappe.msgprint(f"Stock Entry(s) created: {', '.join([f'<a href=\'/app/stock-entry/{se}\'>{se}</a>' for se in stock_entries])}")
 
 	def on_submit(self):
+		update_ledger_for_dispatch(self)
+		update_occupancy_for_dispatch(self)
+		update_daily_stat_for_dispatch(self)
 		self.make_stock_entry()
 		# The original on_submit logic for Sales Invoice creation
 		if not self.items:
@@ -327,6 +353,10 @@ class ColdStorageDispatch(Document):
 			"""
 			frappe.sendmail(recipients=[contact_email], subject=subject, message=message)
 	def on_cancel(self):
+		update_ledger_for_dispatch(self, cancel=True)
+		update_occupancy_for_dispatch(self, cancel=True)
+		update_daily_stat_for_dispatch(self, cancel=True)
+
 		if self.stock_entry:
 			try:
 				se = frappe.get_doc("Stock Entry", self.stock_entry)
@@ -396,11 +426,15 @@ def get_customer_batches(doctype, txt, searchfield, start, page_len, filters):
 		LIMIT %s, %s
 	""", tuple(values + [start, page_len]), as_dict=True)
 
+	receipt_balances = {}
+	if receipt:
+		receipt_balances = utils.get_batch_balances([[receipt, row.batch_no] for row in data])
+
 	results = []
 	for row in data:
 		balance = 0
 		if receipt:
-			balance = get_batch_balance(receipt, row.batch_no)
+			balance = flt(receipt_balances.get(utils.get_ledger_name(receipt, row.batch_no)))
 		elif warehouse and customer:
 			balance = get_total_batch_balance(customer, warehouse, row.batch_no)
 		
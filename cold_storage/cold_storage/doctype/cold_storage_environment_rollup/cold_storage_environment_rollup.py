@@ -0,0 +1,291 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, flt, get_datetime, getdate, now_datetime, nowdate
+
+METRICS = ("temperature", "humidity", "co2")
+
+# resolution: (bucket format for MariaDB DATE_FORMAT, fields of datetime.replace)
+RESOLUTIONS = {
+	"Minute": ("%%Y-%%m-%%d %%H:%%i:00", {"second": 0, "microsecond": 0}),
+	"Hour": ("%%Y-%%m-%%d %%H:00:00", {"minute": 0, "second": 0, "microsecond": 0}),
+	"Day": ("%%Y-%%m-%%d 00:00:00", {"hour": 0, "minute": 0, "second": 0, "microsecond": 0}),
+}
+
+ROLLUP_RETENTION_FIELDS = {
+	"Minute": "minute_rollup_retention_days",
+	"Hour": "hour_rollup_retention_days",
+	"Day": "day_rollup_retention_days",
+}
+
+class ColdStorageEnvironmentRollup(Document):
+	pass
+
+
+def get_rollup_name(sensor, resolution, bucket):
+	"""Primary key of the rollup row for a (sensor, resolution, bucket)"""
+	return f"{sensor}:{resolution}:{bucket}"
+
+def get_bucket(timestamp, resolution):
+	return timestamp.replace(**RESOLUTIONS[resolution][1])
+
+
+def update_rollups(readings, sensors):
+	"""
+	Fold freshly inserted readings into the minute, hour and day rollups with
+	a single upsert, inside the caller's transaction.
+	sensors: {sensor name: sensor} used for the warehouse.
+	"""
+	entries = {}
+	for r in readings:
+		for resolution in RESOLUTIONS:
+			bucket = get_bucket(r.timestamp, resolution)
+			key = get_rollup_name(r.sensor, resolution, bucket)
+			entry = entries.get(key)
+			if not entry:
+				entry = entries[key] = frappe._dict({
+					"sensor": r.sensor,
+					"warehouse": sensors[r.sensor].warehouse,
+					"resolution": resolution,
+					"bucket": bucket,
+					"reading_count": 0
+				})
+				for metric in METRICS:
+					entry[f"{metric}_min"] = entry[f"{metric}_max"] = flt(r[metric])
+					entry[f"{metric}_sum"] = 0
+
+			entry.reading_count += 1
+			for metric in METRICS:
+				value = flt(r[metric])
+				entry[f"{metric}_min"] = min(entry[f"{metric}_min"], value)
+				entry[f"{metric}_max"] = max(entry[f"{metric}_max"], value)
+				entry[f"{metric}_sum"] += value
+
+	apply_rollup_entries(entries)
+
+def apply_rollup_entries(entries):
+	if not entries:
+		return
+
+	now = now_datetime()
+	user = frappe.session.user
+	placeholders = []
+	values = []
+	for name, e in entries.items():
+		placeholders.append("(%s, %s, %s, %s, %s, 0, %s, %s, %s, %s, %s" + ", %s, %s, %s" * len(METRICS) + ")")
+		values.extend([name, now, now, user, user, e.sensor, e.warehouse, e.resolution, e.bucket, e.reading_count])
+		for metric in METRICS:
+			values.extend([e[f"{metric}_min"], e[f"{metric}_max"], e[f"{metric}_sum"] / e.reading_count])
+
+	metric_columns = ", ".join(f"{m}_min, {m}_max, {m}_avg" for m in METRICS)
+	# Assignments run left to right: averages and extremes must be merged
+	# while reading_count still holds the old count, so it is updated last
+	metric_updates = ",\n".join(
+		f"{m}_avg = ({m}_avg * reading_count + VALUES({m}_avg) * VALUES(reading_count))"
+		f" / (reading_count + VALUES(reading_count)),"
+		f" {m}_min = LEAST({m}_min, VALUES({m}_min)), {m}_max = GREATEST({m}_max, VALUES({m}_max))"
+		for m in METRICS
+	)
+
+	frappe.db.sql(f"""
+		INSERT INTO `tabCold Storage Environment Rollup`
+			(name, creation, modified, owner, modified_by, docstatus,
+			sensor, warehouse, resolution, bucket, reading_count, {metric_columns})
+		VALUES {", ".join(placeholders)}
+		ON DUPLICATE KEY UPDATE
+			{metric_updates},
+			reading_count = reading_count + VALUES(reading_count),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+	""", tuple(values))
+
+
+def rebuild_environment_rollups(from_date=None, to_date=None):
+	"""
+	Recompute rollups from the raw Environment Readings, optionally only for
+	the days from from_date to to_date (inclusive).
+	Usage: bench --site [site] rebuild-environment-rollups
+	"""
+	# Whole days only, so no Day bucket is only partly rebuilt
+	values = {
+		"from_date": getdate(from_date) if from_date else None,
+		"to_date": add_days(getdate(to_date), 1) if to_date else None
+	}
+	bucket_conditions = []
+	reading_conditions = []
+	if from_date:
+		bucket_conditions.append("bucket >= %(from_date)s")
+		reading_conditions.append("r.timestamp >= %(from_date)s")
+	if to_date:
+		bucket_conditions.append("bucket < %(to_date)s")
+		reading_conditions.append("r.timestamp < %(to_date)s")
+
+	frappe.db.sql(f"""
+		DELETE FROM `tabCold Storage Environment Rollup`
+		{"WHERE " + " AND ".join(bucket_conditions) if bucket_conditions else ""}
+	""", values)
+
+	now = now_datetime()
+	metric_columns = ", ".join(f"{m}_min, {m}_max, {m}_avg" for m in METRICS)
+	metric_aggregates = ", ".join(
+		f"MIN(IFNULL(r.{m}, 0)), MAX(IFNULL(r.{m}, 0)), AVG(IFNULL(r.{m}, 0))" for m in METRICS
+	)
+	for resolution, (bucket_format, _fields) in RESOLUTIONS.items():
+		frappe.db.sql(f"""
+			INSERT INTO `tabCold Storage Environment Rollup`
+				(name, creation, modified, owner, modified_by, docstatus,
+				sensor, warehouse, resolution, bucket, reading_count, {metric_columns})
+			SELECT
+				CONCAT(r.sensor, ':', %(resolution)s, ':', DATE_FORMAT(r.timestamp, '{bucket_format}')),
+				%(now)s, %(now)s, %(user)s, %(user)s, 0,
+				r.sensor, MAX(s.warehouse), %(resolution)s, DATE_FORMAT(r.timestamp, '{bucket_format}'),
+				COUNT(*), {metric_aggregates}
+			FROM `tabCold Storage Environment Reading` r
+			LEFT JOIN `tabCold Storage Environment Sensor` s ON s.name = r.sensor
+			WHERE r.timestamp IS NOT NULL {"".join(" AND " + c for c in reading_conditions)}
+			GROUP BY r.sensor, DATE_FORMAT(r.timestamp, '{bucket_format}')
+		""", {**values, "resolution": resolution, "now": now, "user": frappe.session.user})
+
+	return frappe.db.count("Cold Storage Environment Rollup")
+
+
+def get_resolution_for_span(from_datetime, to_datetime):
+	"""Finest resolution that keeps a chart to a few hundred points"""
+	hours = (to_datetime - from_datetime).total_seconds() / 3600
+	if hours <= 6:
+		return "Minute"
+	if hours <= 24 * 14:
+		return "Hour"
+	return "Day"
+
+def get_rollup_series(metric, from_datetime, to_datetime, resolution=None, sensor=None, warehouse=None):
+	"""
+	Per-bucket min/max/avg of a metric across the selected sensors, read from
+	the rollup resolution that fits the span.
+	"""
+	if metric not in METRICS:
+		frappe.throw(f"Unknown metric {metric}")
+
+	resolution = resolution or get_resolution_for_span(from_datetime, to_datetime)
+
+	# Buckets past this resolution's retention are rebuilt from the archive
+	archived = []
+	retention = cint(frappe.get_cached_doc("Cold Storage Settings").get(ROLLUP_RETENTION_FIELDS[resolution]))
+	if retention:
+		cutoff = get_datetime(add_days(nowdate(), -retention))
+		if from_datetime < cutoff:
+			from cold_storage.cold_storage.environment_archive import get_archived_series
+
+			sensors = [sensor] if sensor else frappe.get_all("Cold Storage Environment Sensor",
+				filters={"warehouse": warehouse} if warehouse else {}, pluck="name")
+			archived = get_archived_series(metric, from_datetime, min(to_datetime, cutoff), resolution, sensors)
+			from_datetime = cutoff
+			if from_datetime > to_datetime:
+				return archived
+
+	conditions = ""
+	if sensor:
+		conditions += " AND sensor = %(sensor)s"
+	if warehouse:
+		conditions += " AND warehouse = %(warehouse)s"
+
+	return archived + frappe.db.sql(f"""
+		SELECT bucket,
+			MIN({metric}_min) as min_value,
+			MAX({metric}_max) as max_value,
+			SUM({metric}_avg * reading_count) / SUM(reading_count) as avg_value,
+			SUM(reading_count) as reading_count
+		FROM `tabCold Storage Environment Rollup`
+		WHERE resolution = %(resolution)s
+			AND bucket BETWEEN %(from_datetime)s AND %(to_datetime)s
+			{conditions}
+		GROUP BY bucket
+		ORDER BY bucket
+	""", {
+		"resolution": resolution,
+		"from_datetime": get_bucket(from_datetime, resolution),
+		"to_datetime": to_datetime,
+		"sensor": sensor,
+		"warehouse": warehouse
+	}, as_dict=True)
+
+
+DEFAULT_TREND_POINTS = 500
+MAX_TREND_POINTS = 5000
+
+@frappe.whitelist()
+def get_environment_trend(metric, from_datetime=None, to_datetime=None, sensor=None, warehouse=None,
+	max_points=DEFAULT_TREND_POINTS):
+	"""
+	Trend of a metric for a sensor, a warehouse or the whole fleet over any
+	window, read from the finest rollup that stays bounded and reduced to at
+	most max_points with Largest-Triangle-Three-Buckets on the averages.
+	"""
+	frappe.has_permission("Cold Storage Environment Rollup", "read", throw=True)
+
+	to_datetime = get_datetime(to_datetime) if to_datetime else now_datetime()
+	from_datetime = get_datetime(from_datetime) if from_datetime else add_days(to_datetime, -7)
+	max_points = min(max(cint(max_points), 3), MAX_TREND_POINTS)
+
+	resolution = get_trend_resolution(from_datetime, to_datetime)
+	series = get_rollup_series(metric, from_datetime, to_datetime, resolution, sensor=sensor, warehouse=warehouse)
+
+	if len(series) > max_points:
+		indices = lttb_indices(
+			[d.bucket.timestamp() for d in series],
+			[flt(d.avg_value) for d in series],
+			max_points
+		)
+		series = [series[i] for i in indices]
+
+	return {
+		"resolution": resolution,
+		"labels": [str(d.bucket) for d in series],
+		"avg": [flt(d.avg_value, 2) for d in series],
+		"min": [flt(d.min_value, 2) for d in series],
+		"max": [flt(d.max_value, 2) for d in series],
+	}
+
+def get_trend_resolution(from_datetime, to_datetime):
+	"""Finest rollup whose row count for the window stays around 10k per series"""
+	hours = (to_datetime - from_datetime).total_seconds() / 3600
+	if hours <= 24 * 7:
+		return "Minute"
+	if hours <= 24 * 366:
+		return "Hour"
+	return "Day"
+
+def lttb_indices(x, y, threshold):
+	"""
+	Indices of the points kept by Largest-Triangle-Three-Buckets. The first and
+	last points are always kept; from each bucket in between, the point forming
+	the largest triangle with the previously kept point and the next bucket's
+	average is chosen. Areas within a bucket are computed in one NumPy pass.
+	"""
+	import numpy as np
+
+	x = np.asarray(x, dtype="float64")
+	y = np.asarray(y, dtype="float64")
+	n = len(x)
+	if threshold >= n or threshold < 3:
+		return np.arange(n)
+
+	# threshold - 2 buckets over the interior points [1, n - 1)
+	edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+	selected = np.empty(threshold, dtype=int)
+	selected[0], selected[-1] = 0, n - 1
+
+	a = 0
+	for i in range(threshold - 2):
+		start, end = edges[i], edges[i + 1]
+		if i + 2 < len(edges):
+			next_start, next_end = edges[i + 1], edges[i + 2]
+		else:
+			next_start, next_end = n - 1, n
+		avg_x = x[next_start:next_end].mean()
+		avg_y = y[next_start:next_end].mean()
+
+		areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+		a = start + int(np.argmax(areas))
+		selected[i + 1] = a
+
+	return selected
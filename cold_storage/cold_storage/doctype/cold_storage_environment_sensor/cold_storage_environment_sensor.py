@@ -1,5 +1,143 @@
 import frappe
 from frappe.model.document import Document
+from frappe.utils import add_to_date, flt, get_datetime, now_datetime
+
+SENSOR_REGISTRY_CACHE_KEY = "cold_storage_sensor_registry"
+UNKNOWN_SENSOR_CACHE_TTL = 3600
+LATEST_READINGS_CACHE_KEY = "cold_storage_sensor_latest"
+# Readings older than this are not shown as current values
+CURRENT_READING_MAX_AGE_MINUTES = 60
 
 class ColdStorageEnvironmentSensor(Document):
-	pass
+	def on_update(self):
+		clear_sensor_registry()
+		frappe.cache.hdel(LATEST_READINGS_CACHE_KEY, self.name)
+		# The device may have been reported as unknown before it was registered
+		frappe.cache.delete_value(get_unknown_sensor_cache_key(self.sensor_id))
+
+	def on_trash(self):
+		clear_sensor_registry()
+		frappe.cache.hdel(LATEST_READINGS_CACHE_KEY, self.name)
+
+
+def get_sensor_registry():
+	"""
+	Map of sensor_id -> {name, sensor_name, warehouse, status, limits} for every
+	registered sensor. Cached in the site cache until a sensor is saved or
+	deleted, or ingest changes a sensor's status (see clear_sensor_registry).
+	"""
+	registry = frappe.cache.get_value(SENSOR_REGISTRY_CACHE_KEY)
+	if registry is None:
+		registry = build_sensor_registry()
+		frappe.cache.set_value(SENSOR_REGISTRY_CACHE_KEY, registry)
+	return registry
+
+def clear_sensor_registry(doc=None, method=None):
+	frappe.cache.delete_value(SENSOR_REGISTRY_CACHE_KEY)
+
+def build_sensor_registry():
+	return {
+		sensor.sensor_id: sensor for sensor in frappe.get_all("Cold Storage Environment Sensor",
+			fields=["name", "sensor_id", "sensor_name", "warehouse", "status",
+				"temperature_limit_high", "temperature_limit_low", "humidity_limit_high", "co2_limit_high"]
+		)
+	}
+
+def get_sensors(device_ids):
+	"""
+	Resolve device ids from the registry. Returns ({sensor_id: sensor}, [unknown ids]).
+	Each unknown id is logged at most once per UNKNOWN_SENSOR_CACHE_TTL so a
+	misconfigured device cannot flood the Error Log.
+	"""
+	registry = get_sensor_registry()
+	sensors = {}
+	unknown = []
+	for device_id in device_ids:
+		if device_id in registry:
+			sensors[device_id] = frappe._dict(registry[device_id])
+		else:
+			unknown.append(device_id)
+
+	to_log = [d for d in unknown if not frappe.cache.get_value(get_unknown_sensor_cache_key(d))]
+	if to_log:
+		# Auto-create sensor if not exists? Maybe later. For now, log error.
+		frappe.log_error("IoT Alert", f"Record received for unknown sensor ID: {', '.join(sorted(to_log))}")
+		for device_id in to_log:
+			frappe.cache.set_value(get_unknown_sensor_cache_key(device_id), 1, expires_in_sec=UNKNOWN_SENSOR_CACHE_TTL)
+
+	return sensors, sorted(unknown)
+
+def get_unknown_sensor_cache_key(device_id):
+	return f"cold_storage_unknown_sensor:{device_id}"
+
+
+def publish_latest_readings(sensors, latest, statuses):
+	"""
+	Store each sensor's newest reading and status in the latest-reading cache
+	hash (one field per sensor), so dashboards never scan the readings table.
+	"""
+	for name, reading in latest.items():
+		entry = frappe.cache.hget(LATEST_READINGS_CACHE_KEY, name)
+		# Late readings from a gateway backlog must not replace a newer value
+		if not entry or get_datetime(entry["timestamp"]) <= reading.timestamp:
+			entry = {
+				"sensor": name,
+				"warehouse": sensors[name].warehouse,
+				"timestamp": reading.timestamp,
+				"temperature": reading.temperature,
+				"humidity": reading.humidity,
+				"co2": reading.co2,
+				"battery": reading.battery if reading.battery is not None else entry and entry.get("battery")
+			}
+		entry["status"] = statuses[name]
+		frappe.cache.hset(LATEST_READINGS_CACHE_KEY, name, entry)
+
+def get_latest_readings():
+	"""Latest reading and status of every sensor, from the cache hash"""
+	latest = frappe.cache.hgetall(LATEST_READINGS_CACHE_KEY)
+	if not latest:
+		latest = warm_latest_readings()
+	return list(latest.values())
+
+def warm_latest_readings():
+	"""Refill the cache hash from each sensor's last_reading, e.g. after a cache flush"""
+	latest = {}
+	for row in frappe.db.sql("""
+		SELECT s.name as sensor, s.warehouse, s.status, s.battery_percentage as battery,
+			r.timestamp, r.temperature, r.humidity, r.co2
+		FROM `tabCold Storage Environment Sensor` s
+		JOIN `tabCold Storage Environment Reading` r
+			ON r.sensor = s.name AND r.timestamp = s.last_reading
+	""", as_dict=True):
+		latest[row.sensor] = dict(row)
+
+	for name, entry in latest.items():
+		frappe.cache.hset(LATEST_READINGS_CACHE_KEY, name, entry)
+	return latest
+
+def get_current_value(metric, filters=None):
+	"""
+	Average of each sensor's latest value from the last hour, fleet-wide or
+	for one warehouse (number card filter {"warehouse": ...}).
+	"""
+	filters = frappe.parse_json(filters) or {}
+	since = add_to_date(now_datetime(), minutes=-CURRENT_READING_MAX_AGE_MINUTES)
+
+	values = [
+		flt(entry.get(metric)) for entry in get_latest_readings()
+		if get_datetime(entry["timestamp"]) >= since
+			and (not filters.get("warehouse") or entry.get("warehouse") == filters.get("warehouse"))
+	]
+	return flt(sum(values) / len(values), 1) if values else 0
+
+@frappe.whitelist()
+def get_current_temperature(filters=None):
+	return get_current_value("temperature", filters)
+
+@frappe.whitelist()
+def get_current_humidity(filters=None):
+	return get_current_value("humidity", filters)
+
+@frappe.whitelist()
+def get_current_co2(filters=None):
+	return get_current_value("co2", filters)
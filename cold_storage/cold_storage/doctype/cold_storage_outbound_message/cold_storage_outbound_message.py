@@ -0,0 +1,213 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_to_date, cint, now_datetime
+
+MAX_WORKERS = 8
+CLAIM_BATCH_SIZE = 200
+MAX_BATCHES_PER_RUN = 50
+MAX_ATTEMPTS = 3
+RETRY_DELAY_MINUTES = 5
+# Messages left in Sending this long belong to a drainer that died
+STALE_SENDING_MINUTES = 15
+# Only one drainer runs at a time, so the provider rate limit holds site-wide.
+# A run stops claiming after DRAIN_TIME_BUDGET seconds, well within the lock timeout.
+DRAIN_LOCK_KEY = "cold_storage_outbound_drain_lock"
+DRAIN_LOCK_TIMEOUT = 600
+DRAIN_TIME_BUDGET = 240
+
+class ColdStorageOutboundMessage(Document):
+	pass
+
+
+def enqueue_whatsapp(number, message, reference_doctype=None, reference_name=None):
+	"""Queue one WhatsApp message for background delivery"""
+	return enqueue_whatsapp_bulk([{
+		"recipient": number,
+		"message": message,
+		"reference_doctype": reference_doctype,
+		"reference_name": reference_name
+	}])
+
+def enqueue_whatsapp_bulk(messages):
+	"""
+	Queue many WhatsApp messages with one multi-row insert, then make sure a
+	drain job is queued once the caller's transaction commits.
+	messages: [{"recipient", "message", "reference_doctype", "reference_name"}]
+	"""
+	settings = frappe.get_cached_doc("Cold Storage WhatsApp Settings")
+	if not settings.enabled:
+		return 0
+
+	now = now_datetime()
+	user = frappe.session.user
+	values = []
+	for m in messages:
+		if not m.get("recipient"):
+			continue
+		values.append((
+			frappe.generate_hash(length=10), now, now, user, user, 0,
+			m["recipient"], "WhatsApp", settings.provider, "Queued", 0,
+			m.get("message"), m.get("reference_doctype"), m.get("reference_name")
+		))
+
+	if not values:
+		return 0
+
+	frappe.db.bulk_insert("Cold Storage Outbound Message",
+		fields=["name", "creation", "modified", "owner", "modified_by", "docstatus",
+			"recipient", "channel", "provider", "status", "attempts",
+			"message", "reference_doctype", "reference_name"],
+		values=values
+	)
+
+	frappe.enqueue(
+		"cold_storage.cold_storage.doctype.cold_storage_outbound_message.cold_storage_outbound_message.drain_outbound_messages",
+		queue="long",
+		job_id="cold_storage_drain_outbound_messages",
+		deduplicate=True,
+		enqueue_after_commit=True
+	)
+	return len(values)
+
+
+class RateLimiter:
+	"""Spaces calls at least 1/rate seconds apart across threads"""
+
+	def __init__(self, rate):
+		self.interval = 1.0 / rate if rate else 0
+		self.lock = threading.Lock()
+		self.next_at = time.monotonic()
+
+	def wait(self):
+		if not self.interval:
+			return
+		with self.lock:
+			now = time.monotonic()
+			wait = self.next_at - now
+			self.next_at = max(now, self.next_at) + self.interval
+		if wait > 0:
+			time.sleep(wait)
+
+
+def drain_outbound_messages():
+	"""
+	Background job (also scheduled every minute): claim queued messages in
+	batches and deliver each batch concurrently on a bounded thread pool,
+	throttled to the provider's rate limit. Delivery results are written
+	back per message; failures are retried a few times before giving up.
+	Holds a Redis lock for the whole run; a run that finds it taken exits.
+	"""
+	from redis.exceptions import LockError
+
+	settings = frappe.get_cached_doc("Cold Storage WhatsApp Settings")
+	if not settings.enabled:
+		return
+
+	lock = frappe.cache.lock(frappe.cache.make_key(DRAIN_LOCK_KEY), timeout=DRAIN_LOCK_TIMEOUT)
+	if not lock.acquire(blocking=False):
+		return
+
+	try:
+		send_outbound_messages(settings)
+	finally:
+		try:
+			lock.release()
+		except LockError:
+			# Expired during a long run; nothing left to release
+			pass
+
+def send_outbound_messages(settings):
+	from cold_storage.cold_storage.whatsapp import get_provider
+
+	release_stale_messages()
+
+	provider = get_provider(settings)
+	limiter = RateLimiter(provider.get_rate_limit())
+	deadline = time.monotonic() + DRAIN_TIME_BUDGET
+
+	def deliver(message):
+		limiter.wait()
+		try:
+			return provider.send(message.recipient, message.message)
+		except Exception as e:
+			return provider.result("Failed", error=str(e))
+
+	with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+		for _i in range(MAX_BATCHES_PER_RUN):
+			if time.monotonic() > deadline:
+				break
+
+			messages = claim_messages(settings.provider)
+			if not messages:
+				break
+
+			results = pool.map(deliver, messages)
+			for message, result in zip(messages, results):
+				record_result(message, result)
+			frappe.db.commit()
+
+def claim_messages(provider):
+	"""
+	Atomically mark the next batch of due messages as Sending under a fresh
+	claim token, and return only the rows carrying that token
+	"""
+	token = frappe.generate_hash(length=16)
+	now = now_datetime()
+	frappe.db.sql("""
+		UPDATE `tabCold Storage Outbound Message`
+		SET status = 'Sending', claimed_by = %(token)s, provider = %(provider)s,
+			modified = %(now)s, attempts = attempts + 1
+		WHERE status = 'Queued' AND (next_attempt_at IS NULL OR next_attempt_at <= %(now)s)
+		ORDER BY creation
+		LIMIT %(limit)s
+	""", {"token": token, "provider": provider, "now": now, "limit": CLAIM_BATCH_SIZE})
+	frappe.db.commit()
+
+	return frappe.get_all("Cold Storage Outbound Message",
+		filters={"claimed_by": token, "status": "Sending"},
+		fields=["name", "recipient", "message", "attempts"],
+		order_by="creation"
+	)
+
+def record_result(message, result):
+	now = now_datetime()
+	if result.status == "Sent":
+		update = {"status": "Sent", "sent_at": now, "provider_message_id": result.message_id, "error": None}
+	elif cint(message.attempts) < MAX_ATTEMPTS:
+		update = {
+			"status": "Queued",
+			"error": result.error,
+			"next_attempt_at": add_to_date(now, minutes=RETRY_DELAY_MINUTES * cint(message.attempts))
+		}
+	else:
+		update = {"status": "Failed", "error": result.error}
+
+	frappe.db.set_value("Cold Storage Outbound Message", message.name, update, update_modified=False)
+
+def release_stale_messages():
+	"""
+	Requeue messages left in Sending by a drainer that died, or fail them if
+	they have used up their attempts, so a message that kills the worker is
+	not resent forever
+	"""
+	now = now_datetime()
+	frappe.db.sql("""
+		UPDATE `tabCold Storage Outbound Message`
+		SET claimed_by = NULL,
+			status = IF(attempts >= %(max_attempts)s, 'Failed', 'Queued'),
+			error = %(error)s,
+			next_attempt_at = IF(attempts >= %(max_attempts)s, next_attempt_at,
+				DATE_ADD(%(now)s, INTERVAL %(retry_delay)s * attempts MINUTE))
+		WHERE status = 'Sending' AND modified < %(stale_before)s
+	""", {
+		"max_attempts": MAX_ATTEMPTS,
+		"error": "Delivery did not complete; the sending worker stopped",
+		"now": now,
+		"retry_delay": RETRY_DELAY_MINUTES,
+		"stale_before": add_to_date(now, minutes=-STALE_SENDING_MINUTES)
+	})
+	frappe.db.commit()
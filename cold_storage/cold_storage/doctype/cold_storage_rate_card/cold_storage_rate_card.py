@@ -1,7 +1,15 @@
 import frappe
 from frappe.model.document import Document
 
+from cold_storage.cold_storage.rate_index import clear_rate_index
+
 class ColdStorageRateCard(Document):
 	def validate(self):
 		if self.valid_from and self.valid_to and self.valid_from > self.valid_to:
 			frappe.throw("Valid From cannot be after Valid To")
+
+	def on_update(self):
+		clear_rate_index()
+
+	def on_trash(self):
+		clear_rate_index()
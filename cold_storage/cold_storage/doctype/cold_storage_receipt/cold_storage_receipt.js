@@ -1,3 +1,32 @@
+// Validate a row against the Source Receipt balance of its batch.
+// Rows sharing the same batch are added up before comparing.
+function check_source_batch_balance(frm, cdt, cdn) {
+    var row = locals[cdt][cdn];
+    let requested = 0;
+    $.each(frm.doc.items || [], function (i, d) {
+        if (d.batch_no == row.batch_no) {
+            requested += flt(d.number_of_bags);
+        }
+    });
+
+    frappe.call({
+        method: "cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_batch_balances",
+        args: {
+            rows: [[frm.doc.source_receipt, row.batch_no]]
+        },
+        callback: function (r) {
+            if (r.message != undefined) {
+                var available = r.message[`${frm.doc.source_receipt}:${row.batch_no}`] || 0;
+                if (requested > available) {
+                    frappe.msgprint(__("Row {0}: Insufficient balance for Batch {1}. Available: {2}, Requested: {3}",
+                        [row.idx, row.batch_no, available, requested]));
+                    frappe.model.set_value(cdt, cdn, "number_of_bags", "");
+                }
+            }
+        }
+    });
+}
+
 
 frappe.ui.form.on('Cold Storage Receipt Item', {
     number_of_bags: function (frm, cdt, cdn) {
@@ -10,23 +39,7 @@ frappe.ui.form.on('Cold Storage Receipt Item', {
 
         // Check availability if Customer Transfer
         if (frm.doc.receipt_type == "Customer Transfer" && frm.doc.source_receipt && row.batch_no) {
-            frappe.call({
-                method: "cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_batch_balance",
-                args: {
-                    linked_receipt: frm.doc.source_receipt,
-                    batch_no: row.batch_no
-                },
-                callback: function (r) {
-                    if (r.message != undefined) {
-                        var available = r.message;
-                        if (row.number_of_bags > available) {
-                            frappe.msgprint(__("Row {0}: Insufficient balance for Batch {1}. Available: {2}, Requested: {3}",
-                                [row.idx, row.batch_no, available, row.number_of_bags]));
-                            frappe.model.set_value(cdt, cdn, "number_of_bags", "");
-                        }
-                    }
-                }
-            });
+            check_source_batch_balance(frm, cdt, cdn);
         } else if (frm.doc.receipt_type == "Warehouse Transfer" && frm.doc.from_warehouse && frm.doc.customer && row.batch_no) {
             frappe.call({
                 method: "cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_total_batch_balance",
@@ -60,24 +73,7 @@ frappe.ui.form.on('Cold Storage Receipt Item', {
     batch_no: function (frm, cdt, cdn) {
         var row = locals[cdt][cdn];
         if (frm.doc.receipt_type == "Customer Transfer" && frm.doc.source_receipt && row.batch_no) {
-            frappe.call({
-                method: "cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch.get_batch_balance",
-                args: {
-                    linked_receipt: frm.doc.source_receipt,
-                    batch_no: row.batch_no
-                },
-                callback: function (r) {
-                    if (r.message != undefined) {
-                        var available = r.message;
-                        // Just check if current val exceeds new batch balance
-                        if (row.number_of_bags > available) {
-                            frappe.msgprint(__("Row {0}: Insufficient balance for Batch {1}. Available: {2}, Requested: {3}",
-                                [row.idx, row.batch_no, available, row.number_of_bags]));
-                            frappe.model.set_value(cdt, cdn, "number_of_bags", "");
-                        }
-                    }
-                }
-            });
+            check_source_batch_balance(frm, cdt, cdn);
         }
         else if (frm.doc.receipt_type == "Warehouse Transfer" && frm.doc.from_warehouse && frm.doc.customer && row.batch_no) {
             frappe.call({
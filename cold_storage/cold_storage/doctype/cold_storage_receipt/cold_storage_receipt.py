@@ -1,8 +1,17 @@
+import hashlib
+import hmac
+
 import frappe
 from frappe import _
 from frappe.utils import flt
 from frappe.model.document import Document
 
+from cold_storage.cold_storage.doctype.cold_storage_batch_ledger.cold_storage_batch_ledger import (
+	update_ledger_for_receipt, clear_receipt_scan_cache, get_receipt_scan_cache_key
+)
+from cold_storage.cold_storage.doctype.cold_storage_warehouse_occupancy.cold_storage_warehouse_occupancy import update_occupancy_for_receipt
+from cold_storage.cold_storage.doctype.cold_storage_daily_stat.cold_storage_daily_stat import update_daily_stat_for_receipt
+
 class ColdStorageReceipt(Document):
 	def onload(self):
 		default_company = frappe.db.get_single_value("Cold Storage Settings", "default_company")
@@ -47,10 +56,9 @@ class ColdStorageReceipt(Document):
 			# Validate Available Balance in Source Receipt
 			# Global Balance Check (Optional if Batch Check is strict, but good to keep)
 			dispatched_count = frappe.db.sql("""
-				SELECT SUM(d_item.number_of_bags) 
-				FROM `tabCold Storage Dispatch` p
-				JOIN `tabCold Storage Dispatch Item` d_item ON d_item.parent = p.name
-				WHERE d_item.linked_receipt = %s AND p.docstatus = 1
+				SELECT SUM(dispatched_qty)
+				FROM `tabCold Storage Batch Ledger`
+				WHERE linked_receipt = %s
 			""", (self.source_receipt))
 			
 			already_dispatched = dispatched_count[0][0] or 0
@@ -60,13 +68,18 @@ class ColdStorageReceipt(Document):
 			if current_transfer_qty > available_qty:
 				frappe.throw(f"Insufficient total balance in Source Receipt {self.source_receipt}. Available: {available_qty}, Requested: {current_transfer_qty}")
 
-			# Validate Batch-Level Availability
-			from cold_storage.cold_storage.doctype.cold_storage_dispatch.cold_storage_dispatch import get_batch_balance
+			# Validate Batch-Level Availability (rows sharing a batch are added up)
+			requested = {}
 			for item in self.items:
 				if item.batch_no:
-					batch_avl = get_batch_balance(self.source_receipt, item.batch_no)
-					if item.number_of_bags > batch_avl:
-						frappe.throw(f"Row {item.idx}: Insufficient balance for Batch {item.batch_no}. Available: {batch_avl}, Requested: {item.number_of_bags}")
+					requested[item.batch_no] = requested.get(item.batch_no, 0) + flt(item.number_of_bags)
+
+			balances = utils.get_batch_balances([[self.source_receipt, batch_no] for batch_no in requested])
+			for item in self.items:
+				if item.batch_no in requested:
+					batch_avl = flt(balances.get(utils.get_ledger_name(self.source_receipt, item.batch_no)))
+					if requested[item.batch_no] > batch_avl:
+						frappe.throw(f"Row {item.idx}: Insufficient balance for Batch {item.batch_no}. Available: {batch_avl}, Requested: {requested[item.batch_no]}")
 
 		# Link Batch to Customer
 		if self.customer:
@@ -104,46 +117,31 @@ class ColdStorageReceipt(Document):
 		# Enforce company again just in case
 		self.company = frappe.db.get_single_value("Cold Storage Settings", "default_company")
 
-		# Generate/Update QR Code
+		# Queue QR Code regeneration only when its content changed
 		if self.name:
-			import qrcode
-			from frappe.utils.file_manager import save_file, remove_file
-			from io import BytesIO
-			
-			# Fetch Customer Name
-			customer_name = frappe.db.get_value("Customer", self.customer, "customer_name") or self.customer
-			
-			# Summarize Items with Batch and Qty
-			items_summary = "; ".join([f"{item.goods_item} ({item.number_of_bags} Bags, Batch: {item.batch_no})" for item in self.items])
-			
-			qr_data = f"Receipt: {self.name}\nCustomer: {customer_name}\nWarehouse: {self.warehouse}\nItems: {items_summary}"
-			
-			# Increase size (default box_size is 10, setting to 40 for very high quality/large)
-			qr = qrcode.QRCode(version=1, box_size=40, border=2)
-			qr.add_data(qr_data)
-			qr.make(fit=True)
-			img = qr.make_image(fill_color="black", back_color="white")
-			
-			buffered = BytesIO()
-			img.save(buffered, format="PNG")
-			img_str = buffered.getvalue()
-			
-			filename = f"QR-{self.name}.png"
-			
-			# Delete old file to ensure refresh
-			if self.qr_code:
-				try:
-					# Find the File doc and remove it
-					file_doc = frappe.get_all("File", filters={"file_url": self.qr_code}, fields=["name"])
-					for f in file_doc:
-						remove_file(f.name)
-				except:
-					pass
-
-			saved_file = save_file(filename, img_str, "Cold Storage Receipt", self.name, is_private=0, df="qr_code")
-			self.qr_code = saved_file.file_url
+			qr_hash = hashlib.md5(get_qr_payload(self).encode()).hexdigest()
+			if qr_hash != self.qr_hash or not self.qr_code:
+				self.qr_hash = qr_hash
+				self.flags.regenerate_qr = True
+
+	def on_update(self):
+		clear_receipt_scan_cache([self.name])
+
+		if self.flags.regenerate_qr:
+			self.flags.regenerate_qr = False
+			frappe.enqueue(
+				"cold_storage.cold_storage.doctype.cold_storage_receipt.cold_storage_receipt.generate_qr_code",
+				queue="short",
+				enqueue_after_commit=True,
+				receipt=self.name,
+				qr_hash=self.qr_hash
+			)
 
 	def on_submit(self):
+		update_ledger_for_receipt(self)
+		update_occupancy_for_receipt(self)
+		update_daily_stat_for_receipt(self)
+
 		if self.receipt_type == "Customer Transfer":
 			self.create_transfer_dispatch(
 				source_customer=self.from_customer,
@@ -357,6 +355,10 @@ class ColdStorageReceipt(Document):
 		if linked_dispatches:
 			frappe.throw(f"Cannot cancel Receipt because linked Dispatch {linked_dispatches[0][0]} exists. Please cancel the Dispatch first.")
 
+		update_ledger_for_receipt(self, cancel=True)
+		update_occupancy_for_receipt(self, cancel=True)
+		update_daily_stat_for_receipt(self, cancel=True)
+
 		if self.stock_entry:
 			try:
 				se = frappe.get_doc("Stock Entry", self.stock_entry)
@@ -450,3 +452,101 @@ def get_customer_warehouse_item_groups(doctype, txt, searchfield, start, page_le
 		LIMIT %s, %s
 	""", (customer, warehouse, f"%{txt}%", start, page_len))
 
+
+QR_TOKEN_LENGTH = 16
+RECEIPT_SCAN_CACHE_TTL = 300
+
+
+def get_qr_token(receipt):
+	"""Short signed token printed in the QR Code: `<receipt name>.<truncated HMAC>`"""
+	return f"{receipt}.{sign_receipt_name(receipt)}"
+
+def sign_receipt_name(receipt):
+	from frappe.utils.password import get_encryption_key
+
+	key = get_encryption_key().encode()
+	return hmac.new(key, receipt.encode(), hashlib.sha256).hexdigest()[:QR_TOKEN_LENGTH]
+
+def verify_qr_token(token):
+	"""Return the receipt name if the token's signature is valid, else None"""
+	receipt, _sep, signature = (token or "").strip().rpartition(".")
+	if not receipt or not hmac.compare_digest(signature, sign_receipt_name(receipt)):
+		return None
+	return receipt
+
+def get_qr_payload(doc):
+	# Only the signed token is encoded; details are looked up live on scan
+	return get_qr_token(doc.name)
+
+@frappe.whitelist()
+def scan_receipt_qr(token):
+	"""Resolve a scanned Receipt QR token to the receipt and its current batch balances"""
+	receipt = verify_qr_token(token)
+	if not receipt:
+		frappe.throw(_("Invalid or tampered QR Code"))
+
+	frappe.has_permission("Cold Storage Receipt", "read", receipt, throw=True)
+
+	cache_key = get_receipt_scan_cache_key(receipt)
+	data = frappe.cache.get_value(cache_key)
+	if data is None:
+		data = get_receipt_scan_data(receipt)
+		frappe.cache.set_value(cache_key, data, expires_in_sec=RECEIPT_SCAN_CACHE_TTL)
+	return data
+
+def get_receipt_scan_data(receipt):
+	doc = frappe.db.get_value("Cold Storage Receipt", receipt,
+		["name", "customer", "warehouse", "receipt_date", "total_bags", "docstatus"], as_dict=True)
+	if not doc:
+		frappe.throw(_("Cold Storage Receipt {0} not found").format(receipt))
+
+	doc.customer_name = frappe.get_cached_value("Customer", doc.customer, "customer_name") or doc.customer
+	doc.items = frappe.db.sql("""
+		SELECT ri.goods_item, ri.item_group, ri.batch_no, ri.number_of_bags,
+			IFNULL(l.balance_qty, 0) as balance_qty
+		FROM `tabCold Storage Receipt Item` ri
+		LEFT JOIN `tabCold Storage Batch Ledger` l
+			ON l.linked_receipt = ri.parent AND IFNULL(l.batch_no, '') = IFNULL(ri.batch_no, '')
+		WHERE ri.parent = %s
+		ORDER BY ri.idx
+	""", (receipt,), as_dict=True)
+
+	# Ledger balances are per batch; count each batch once in the total
+	balances = {}
+	for item in doc.items:
+		balances[item.batch_no or ""] = flt(item.balance_qty)
+	doc.balance_qty = sum(balances.values())
+	return doc
+
+def generate_qr_code(receipt, qr_hash):
+	"""Background job: render the Receipt QR Code and attach it, replacing the old file"""
+	import qrcode
+	import qrcode.image.svg
+	from frappe.utils.file_manager import save_file, remove_file
+	from io import BytesIO
+
+	# Skip if the receipt changed again since this job was queued; a newer job will follow
+	current_hash, old_qr_code = frappe.db.get_value("Cold Storage Receipt", receipt, ["qr_hash", "qr_code"]) or (None, None)
+	if current_hash != qr_hash:
+		return
+
+	# The short token fits a low QR version; SVG stays sharp at any print size
+	qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=10, border=2)
+	qr.add_data(get_qr_token(receipt))
+	qr.make(fit=True)
+	img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+
+	buffered = BytesIO()
+	img.save(buffered)
+
+	saved_file = save_file(f"QR-{receipt}.svg", buffered.getvalue(), "Cold Storage Receipt", receipt, is_private=0, df="qr_code")
+
+	# Delete old file once the new one is in place
+	if old_qr_code and old_qr_code != saved_file.file_url:
+		for f in frappe.get_all("File", filters={"file_url": old_qr_code}, pluck="name"):
+			try:
+				remove_file(f)
+			except Exception:
+				pass
+
+	frappe.db.set_value("Cold Storage Receipt", receipt, "qr_code", saved_file.file_url, update_modified=False)
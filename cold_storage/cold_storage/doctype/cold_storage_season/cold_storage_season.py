@@ -1,7 +1,15 @@
 import frappe
 from frappe.model.document import Document
 
+from cold_storage.cold_storage.rate_index import clear_rate_index
+
 class ColdStorageSeason(Document):
 	def validate(self):
 		if self.from_date and self.to_date and self.from_date > self.to_date:
 			frappe.throw("From Date cannot be after To Date")
+
+	def on_update(self):
+		clear_rate_index()
+
+	def on_trash(self):
+		clear_rate_index()
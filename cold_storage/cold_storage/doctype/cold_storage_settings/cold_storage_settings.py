@@ -1,5 +1,27 @@
 import frappe
+from frappe import _
+from frappe.utils import cint
 from frappe.model.document import Document
 
+from cold_storage.cold_storage.rate_index import clear_rate_index
+
 class ColdStorageSettings(Document):
-	pass
+	def validate(self):
+		self.validate_environment_retention()
+
+	def validate_environment_retention(self):
+		# Raw readings are only purged once their rollups are confirmed,
+		# so rollups must outlive them
+		reading_days = cint(self.reading_retention_days)
+		if not reading_days:
+			return
+
+		for fieldname in ("minute_rollup_retention_days", "hour_rollup_retention_days", "day_rollup_retention_days"):
+			days = cint(self.get(fieldname))
+			if days and days < reading_days:
+				frappe.throw(_("{0} must be 0 or at least the Raw Readings retention ({1} days)").format(
+					_(self.meta.get_label(fieldname)), reading_days
+				))
+
+	def on_update(self):
+		clear_rate_index()
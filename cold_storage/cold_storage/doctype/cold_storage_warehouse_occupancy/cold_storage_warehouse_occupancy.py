@@ -0,0 +1,165 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now_datetime
+
+class ColdStorageWarehouseOccupancy(Document):
+	pass
+
+
+def get_bag_counts(item_group, qty):
+	"""Split a quantity into the occupancy counters it affects"""
+	qty = flt(qty)
+	counts = frappe._dict({"jute_bags": 0, "net_bags": 0, "total_bags": qty})
+	# Rows without an item group are treated as Jute Bags;
+	# other item groups do not count towards capacity
+	if item_group in ("Jute Bag", None, ""):
+		counts.jute_bags = qty
+	elif item_group == "Net Bag":
+		counts.net_bags = qty
+	return counts
+
+
+def update_occupancy_for_receipt(doc, cancel=False):
+	entries = {}
+	for item in doc.items:
+		add_entry(entries, doc.warehouse, item.item_group, item.number_of_bags)
+
+	apply_occupancy_entries(entries, -1 if cancel else 1)
+
+def update_occupancy_for_dispatch(doc, cancel=False):
+	entries = {}
+	for item in doc.items:
+		add_entry(entries, item.warehouse, item.item_group, -flt(item.number_of_bags))
+
+	apply_occupancy_entries(entries, -1 if cancel else 1)
+
+def add_entry(entries, warehouse, item_group, qty):
+	if not warehouse:
+		return
+
+	counts = get_bag_counts(item_group, qty)
+	entry = entries.setdefault(warehouse, frappe._dict({"jute_bags": 0, "net_bags": 0, "total_bags": 0}))
+	entry.jute_bags += counts.jute_bags
+	entry.net_bags += counts.net_bags
+	entry.total_bags += counts.total_bags
+
+def apply_occupancy_entries(entries, sign=1):
+	"""
+	Atomically add the deltas to each warehouse's counters in a single
+	statement, inside the caller's transaction.
+	"""
+	if not entries:
+		return
+
+	now = now_datetime()
+	user = frappe.session.user
+	placeholders = []
+	values = []
+	for warehouse, e in entries.items():
+		jute = sign * flt(e.jute_bags)
+		net = sign * flt(e.net_bags)
+		placeholders.append("(%s, %s, %s, %s, %s, 0, %s, %s, %s, %s, %s)")
+		values.extend([
+			warehouse, now, now, user, user, warehouse,
+			jute, net, sign * flt(e.total_bags), jute + (net / 2)
+		])
+
+	frappe.db.sql(f"""
+		INSERT INTO `tabCold Storage Warehouse Occupancy`
+			(name, creation, modified, owner, modified_by, docstatus,
+			warehouse, jute_bags, net_bags, total_bags, equivalent_stock)
+		VALUES {", ".join(placeholders)}
+		ON DUPLICATE KEY UPDATE
+			jute_bags = jute_bags + VALUES(jute_bags),
+			net_bags = net_bags + VALUES(net_bags),
+			total_bags = total_bags + VALUES(total_bags),
+			equivalent_stock = equivalent_stock + VALUES(equivalent_stock),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+	""", tuple(values))
+
+
+def reconcile_warehouse_occupancy(log_drift=True):
+	"""
+	Scheduled job: recompute the counters from submitted Receipts and
+	Dispatches and overwrite them. The recompute and the overwrite are one
+	INSERT ... SELECT ... ON DUPLICATE KEY UPDATE, so a document submitted
+	meanwhile is either part of the recomputed totals or applies its delta
+	afterwards; it is never lost.
+	"""
+	drifted = get_drifted_warehouses() if log_drift else []
+
+	now = now_datetime()
+	frappe.db.sql("""
+		INSERT INTO `tabCold Storage Warehouse Occupancy`
+			(name, creation, modified, owner, modified_by, docstatus,
+			warehouse, jute_bags, net_bags, total_bags, equivalent_stock, last_reconciled)
+		SELECT
+			s.warehouse, %(now)s, %(now)s, %(user)s, %(user)s, 0,
+			s.warehouse, s.jute_bags, s.net_bags, s.total_bags,
+			s.jute_bags + s.net_bags / 2, %(now)s
+		FROM (
+			SELECT m.warehouse,
+				-- Item groups other than Jute/Net do not count towards capacity;
+				-- rows without an item group are treated as Jute Bags
+				SUM(IF(IFNULL(m.item_group, '') IN ('', 'Jute Bag'), m.qty, 0)) as jute_bags,
+				SUM(IF(m.item_group = 'Net Bag', m.qty, 0)) as net_bags,
+				SUM(m.qty) as total_bags
+			FROM (
+				SELECT r.warehouse, ri.item_group, ri.number_of_bags as qty
+				FROM `tabCold Storage Receipt` r
+				JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
+				WHERE r.docstatus = 1
+
+				UNION ALL
+
+				SELECT di.warehouse, di.item_group, -di.number_of_bags as qty
+				FROM `tabCold Storage Dispatch Item` di
+				WHERE di.docstatus = 1
+
+				UNION ALL
+
+				-- Existing counters with no stock left are reset to zero
+				SELECT o.warehouse, NULL, 0
+				FROM `tabCold Storage Warehouse Occupancy` o
+			) m
+			WHERE IFNULL(m.warehouse, '') != ''
+			GROUP BY m.warehouse
+		) s
+		ON DUPLICATE KEY UPDATE
+			jute_bags = VALUES(jute_bags),
+			net_bags = VALUES(net_bags),
+			total_bags = VALUES(total_bags),
+			equivalent_stock = VALUES(equivalent_stock),
+			last_reconciled = VALUES(last_reconciled),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+	""", {"now": now, "user": frappe.session.user})
+
+	if drifted:
+		frappe.log_error("Warehouse Occupancy Drift", f"Reconciled occupancy for: {', '.join(sorted(drifted))}")
+
+	frappe.db.commit()
+
+def get_drifted_warehouses():
+	"""
+	Warehouses whose counters differ from a fresh recompute. Informational
+	only: a document in flight can show up here without any real drift.
+	"""
+	from cold_storage.cold_storage.utils import get_warehouse_stock
+
+	stock = get_warehouse_stock()
+	current = {
+		row.name: row for row in frappe.get_all("Cold Storage Warehouse Occupancy",
+			fields=["name", "jute_bags", "net_bags", "total_bags"]
+		)
+	}
+
+	empty = frappe._dict({"jute_bags": 0, "net_bags": 0, "total_bags": 0})
+	return [
+		warehouse for warehouse in set(stock) | set(current)
+		if warehouse and any(
+			flt((current.get(warehouse) or empty)[f]) != flt((stock.get(warehouse) or empty)[f])
+			for f in ("jute_bags", "net_bags", "total_bags")
+		)
+	]
@@ -0,0 +1,196 @@
+import frappe
+from frappe.utils import cint, flt, now_datetime, add_to_date, format_datetime
+
+from cold_storage.cold_storage.doctype.cold_storage_outbound_message.cold_storage_outbound_message import (
+	enqueue_whatsapp_bulk,
+)
+
+ALERT_DOCTYPE = "Cold Storage Environment Alert"
+
+# condition: (reading field, sensor limit field, settings hysteresis field, direction, emoji, unit)
+CONDITIONS = {
+	"High Temperature": ("temperature", "temperature_limit_high", "temperature_hysteresis", 1, "🌡", "°C"),
+	"Low Temperature": ("temperature", "temperature_limit_low", "temperature_hysteresis", -1, "❄", "°C"),
+	"High Humidity": ("humidity", "humidity_limit_high", "humidity_hysteresis", 1, "💧", "%"),
+	"High CO2": ("co2", "co2_limit_high", "co2_hysteresis", 1, "🌫", " ppm"),
+}
+
+
+def evaluate_alerts(sensors, readings):
+	"""
+	Run each sensor's alert state machine over its readings in time order.
+	An alert opens when a reading breaches a limit and closes only once the
+	reading is back inside the limit by the hysteresis band. Notifications
+	are queued on open (outside the cooldown), on close and as reminders
+	every re-notify interval, never per reading.
+
+	sensors: {sensor name: sensor from the registry}
+	Returns {sensor name: "Alarm" | "Online"}.
+	"""
+	settings = get_alert_settings()
+	now = now_datetime()
+
+	open_alerts = {}
+	for alert in frappe.get_all(ALERT_DOCTYPE,
+		filters={"status": "Open", "sensor": ["in", list(sensors)]},
+		fields=["name", "sensor", "condition", "limit_value", "peak_value", "opened_at",
+			"last_notified_at", "notification_count"]
+	):
+		open_alerts[(alert.sensor, alert.condition)] = alert
+
+	dirty = set()
+	opened = set()
+	for reading in sorted(readings, key=lambda r: r.timestamp):
+		sensor = sensors[reading.sensor]
+		for condition, (field, limit_field, hysteresis_field, direction, _emoji, _unit) in CONDITIONS.items():
+			key = (sensor.name, condition)
+			alert = open_alerts.get(key)
+			limit = flt(sensor.get(limit_field))
+			value = flt(reading.get(field))
+
+			if alert is None:
+				if limit and is_breached(value, limit, direction):
+					open_alerts[key] = open_alert(sensor, condition, limit, reading, settings, now)
+					opened.add(open_alerts[key].name)
+				continue
+
+			# A removed limit closes its alert; otherwise wait for the hysteresis band
+			if not limit or is_cleared(value, limit, settings.hysteresis[hysteresis_field], direction):
+				close_alert(alert, reading)
+				del open_alerts[key]
+				dirty.discard(alert.name)
+			elif direction * (value - flt(alert.peak_value)) > 0:
+				alert.peak_value = value
+				dirty.add(alert.name)
+
+	for alert in open_alerts.values():
+		update = {}
+		if alert.name in dirty:
+			update["peak_value"] = alert.peak_value
+
+		# Remind while the alarm stays open (also covers one opened during a cooldown)
+		last_notified = alert.last_notified_at or alert.opened_at
+		if settings.renotify and alert.name not in opened and add_to_date(last_notified, minutes=settings.renotify) <= now:
+			update.update({"last_notified_at": now, "notification_count": cint(alert.notification_count) + 1})
+			queue_notification(alert.name, "Reminder")
+
+		if update:
+			frappe.db.set_value(ALERT_DOCTYPE, alert.name, update, update_modified=False)
+
+	alarmed = {sensor for sensor, _condition in open_alerts}
+	return {name: "Alarm" if name in alarmed else "Online" for name in sensors}
+
+def get_alert_settings():
+	settings = frappe.get_cached_doc("Cold Storage Settings")
+	return frappe._dict({
+		"cooldown": cint(settings.alert_cooldown_minutes),
+		"renotify": cint(settings.alert_renotify_minutes),
+		"hysteresis": {
+			"temperature_hysteresis": flt(settings.temperature_hysteresis),
+			"humidity_hysteresis": flt(settings.humidity_hysteresis),
+			"co2_hysteresis": flt(settings.co2_hysteresis),
+		}
+	})
+
+def is_breached(value, limit, direction):
+	return value > limit if direction > 0 else value < limit
+
+def is_cleared(value, limit, band, direction):
+	return value <= limit - band if direction > 0 else value >= limit + band
+
+def open_alert(sensor, condition, limit, reading, settings, now):
+	value = flt(reading.get(CONDITIONS[condition][0]))
+
+	# Cooldown: a condition that keeps flapping is only announced once per window
+	cooldown_key = f"cold_storage_alert_cooldown:{sensor.name}:{condition}"
+	notify = not (settings.cooldown and frappe.cache.get_value(cooldown_key))
+
+	alert = frappe.get_doc({
+		"doctype": ALERT_DOCTYPE,
+		"sensor": sensor.name,
+		"warehouse": sensor.warehouse,
+		"condition": condition,
+		"status": "Open",
+		"limit_value": limit,
+		"trigger_value": value,
+		"peak_value": value,
+		"opened_at": reading.timestamp,
+		"last_notified_at": now if notify else None,
+		"notification_count": 1 if notify else 0
+	}).insert(ignore_permissions=True)
+
+	if notify:
+		if settings.cooldown:
+			frappe.cache.set_value(cooldown_key, 1, expires_in_sec=settings.cooldown * 60)
+		queue_notification(alert.name, "Opened")
+
+	return frappe._dict({
+		"name": alert.name,
+		"sensor": sensor.name,
+		"condition": condition,
+		"limit_value": limit,
+		"peak_value": value,
+		"opened_at": alert.opened_at,
+		"last_notified_at": alert.last_notified_at,
+		"notification_count": alert.notification_count
+	})
+
+def close_alert(alert, reading):
+	frappe.db.set_value(ALERT_DOCTYPE, alert.name, {
+		"status": "Closed",
+		"closed_at": reading.timestamp,
+		"peak_value": alert.peak_value
+	})
+
+	# Only announce recovery of alarms someone was told about
+	if cint(alert.notification_count):
+		queue_notification(alert.name, "Closed")
+
+def queue_notification(alert, event):
+	frappe.enqueue(
+		"cold_storage.cold_storage.environment_alerts.send_alert_notification",
+		queue="short",
+		enqueue_after_commit=True,
+		alert=alert,
+		event=event
+	)
+
+
+def send_alert_notification(alert, event):
+	"""Background job: queue an alert transition for the WhatsApp summary recipients"""
+	wa_settings = frappe.get_cached_doc("Cold Storage WhatsApp Settings")
+	if not wa_settings.enabled or not wa_settings.summary_recipients:
+		return
+
+	alert = frappe.get_doc(ALERT_DOCTYPE, alert)
+	message = get_alert_message(alert, event)
+
+	recipients = [r.strip() for r in wa_settings.summary_recipients.split('\n') if r.strip()]
+	enqueue_whatsapp_bulk([
+		{"recipient": number, "message": message, "reference_doctype": ALERT_DOCTYPE, "reference_name": alert.name}
+		for number in recipients
+	])
+
+def get_alert_message(alert, event):
+	sensor_name = frappe.db.get_value("Cold Storage Environment Sensor", alert.sensor, "sensor_name") or alert.sensor
+	_field, _limit, _hysteresis, _direction, emoji, unit = CONDITIONS[alert.condition]
+
+	if event == "Closed":
+		message = f"✅ *Environment Recovered: {sensor_name}*\n"
+	elif event == "Reminder":
+		message = f"⏰ *Environment Alert Still Open: {sensor_name}*\n"
+	else:
+		message = f"🚨 *Environment Alert: {sensor_name}*\n"
+
+	message += f"Warehouse: {alert.warehouse or 'Unknown'}\n\n"
+	message += f"• {emoji} {alert.condition}: {alert.trigger_value}{unit} (Limit: {alert.limit_value}{unit})\n"
+	if event != "Opened":
+		message += f"• Peak: {alert.peak_value}{unit}\n"
+
+	message += f"\nSince: {format_datetime(alert.opened_at)}\n"
+	if event == "Closed":
+		message += f"Recovered: {format_datetime(alert.closed_at)}\n"
+	else:
+		message += f"\n_Please check the cold room immediately._"
+
+	return message
@@ -0,0 +1,161 @@
+import os
+import re
+
+import frappe
+from frappe.utils import add_months, get_datetime, get_first_day, getdate
+
+ARCHIVE_FOLDER = "environment_archive"
+METRICS = ("temperature", "humidity", "co2")
+BUCKET_SECONDS = {"Minute": 60, "Hour": 3600, "Day": 86400}
+
+
+def get_archive_path(sensor, month):
+	"""Archive file of one sensor for one month: private/files/environment_archive/<sensor>/<YYYY-MM>.npz"""
+	folder = re.sub(r"[^A-Za-z0-9_.-]", "_", sensor)
+	return frappe.get_site_path("private", "files", ARCHIVE_FOLDER, folder, f"{getdate(month):%Y-%m}.npz")
+
+
+def archive_readings(from_datetime, to_datetime):
+	"""
+	Export the raw readings in [from_datetime, to_datetime) into the per sensor,
+	per month archive files. New rows are merged into what is already archived:
+	an archived row is only replaced by a new one with the same timestamp, so
+	re-archiving a range whose readings are partly purged loses nothing.
+	Float columns are never NULL, so a metric the sensor lacks is archived as 0
+	exactly as it is stored.
+	"""
+	import numpy as np
+
+	rows = frappe.db.sql("""
+		SELECT sensor, timestamp, temperature, humidity, co2
+		FROM `tabCold Storage Environment Reading`
+		WHERE timestamp >= %s AND timestamp < %s
+		ORDER BY sensor, timestamp
+	""", (from_datetime, to_datetime), as_dict=True)
+
+	partitions = {}
+	for row in rows:
+		partitions.setdefault((row.sensor, get_first_day(row.timestamp)), []).append(row)
+
+	for (sensor, month), readings in partitions.items():
+		new = {
+			"timestamp": np.array([r.timestamp for r in readings], dtype="datetime64[s]"),
+			**{m: np.array([r[m] or 0 for r in readings], dtype="float32") for m in METRICS}
+		}
+
+		path = get_archive_path(sensor, month)
+		existing = load_archive_file(path)
+		if existing:
+			keep = ~np.isin(existing["timestamp"], new["timestamp"])
+			new = {k: np.concatenate([existing[k][keep], new[k]]) for k in new}
+			order = np.argsort(new["timestamp"], kind="stable")
+			new = {k: v[order] for k, v in new.items()}
+
+		write_archive_file(path, new)
+
+	return len(rows)
+
+def load_archive_file(path):
+	import numpy as np
+
+	if not os.path.exists(path):
+		return None
+
+	with np.load(path) as data:
+		return {k: data[k] for k in data.files}
+
+def write_archive_file(path, arrays):
+	import numpy as np
+
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	# Write beside the target and swap in, so readers never see a partial file
+	tmp_path = f"{path}.tmp"
+	with open(tmp_path, "wb") as f:
+		np.savez_compressed(f, **arrays)
+	os.replace(tmp_path, path)
+
+
+def read_archive(sensors, from_datetime, to_datetime, metrics=METRICS):
+	"""
+	Archived readings of the given sensors in [from_datetime, to_datetime), as
+	NumPy arrays {"timestamp": datetime64[s], <metric>: float32} sorted by time.
+	Only the needed month files are opened, and only the requested columns of
+	each are decompressed.
+	"""
+	import numpy as np
+
+	start = np.datetime64(get_datetime(from_datetime), "s")
+	end = np.datetime64(get_datetime(to_datetime), "s")
+
+	months = []
+	month = get_first_day(from_datetime)
+	while month <= getdate(to_datetime):
+		months.append(month)
+		month = add_months(month, 1)
+
+	parts = []
+	for sensor in sensors:
+		for month in months:
+			path = get_archive_path(sensor, month)
+			if not os.path.exists(path):
+				continue
+
+			with np.load(path) as data:
+				timestamps = data["timestamp"]
+				mask = (timestamps >= start) & (timestamps < end)
+				if mask.any():
+					parts.append({"timestamp": timestamps[mask], **{m: data[m][mask] for m in metrics}})
+
+	if not parts:
+		return {"timestamp": np.array([], dtype="datetime64[s]"), **{m: np.array([], dtype="float32") for m in metrics}}
+
+	result = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+	order = np.argsort(result["timestamp"], kind="stable")
+	return {k: v[order] for k, v in result.items()}
+
+def get_archived_series(metric, from_datetime, to_datetime, resolution, sensors):
+	"""
+	Bucket archived readings the same way as Cold Storage Environment Rollup,
+	for ranges whose rollups have already expired.
+	"""
+	import numpy as np
+
+	data = read_archive(sensors, from_datetime, to_datetime, metrics=(metric,))
+	if not len(data["timestamp"]):
+		return []
+
+	size = BUCKET_SECONDS[resolution]
+	seconds = data["timestamp"].astype("int64")
+	buckets = seconds - seconds % size
+	values = data[metric].astype("float64")
+
+	order = np.argsort(buckets, kind="stable")
+	buckets, values = buckets[order], values[order]
+	keys, starts, counts = np.unique(buckets, return_index=True, return_counts=True)
+
+	mins = np.minimum.reduceat(values, starts)
+	maxs = np.maximum.reduceat(values, starts)
+	avgs = np.add.reduceat(values, starts) / counts
+
+	return [
+		frappe._dict({
+			"bucket": bucket.astype("datetime64[s]").astype(object),
+			"min_value": float(mins[i]),
+			"max_value": float(maxs[i]),
+			"avg_value": float(avgs[i]),
+			"reading_count": int(counts[i])
+		})
+		for i, bucket in enumerate(keys)
+	]
+
+
+@frappe.whitelist()
+def get_archived_readings(sensor, from_datetime, to_datetime):
+	"""Raw archived readings of one sensor, e.g. for a compliance audit export"""
+	frappe.has_permission("Cold Storage Environment Sensor", "read", sensor, throw=True)
+
+	data = read_archive([sensor], from_datetime, to_datetime)
+	return {
+		"timestamp": [str(t) for t in data["timestamp"].astype(object)],
+		**{m: data[m].tolist() for m in METRICS}
+	}
@@ -0,0 +1,112 @@
+import frappe
+from frappe.utils import add_days, cint, get_datetime, getdate, nowdate
+
+from cold_storage.cold_storage.doctype.cold_storage_environment_rollup.cold_storage_environment_rollup import (
+	rebuild_environment_rollups,
+)
+from cold_storage.cold_storage.environment_archive import archive_readings
+
+DELETE_CHUNK_SIZE = 5000
+MAX_CHUNKS_PER_RUN = 500
+
+
+def apply_environment_retention():
+	"""
+	Scheduled job: delete raw readings and rollups older than their configured
+	retention (Cold Storage Settings > Environment Data Retention).
+	Raw readings are removed one day at a time, only after that day's rollups
+	have been checked against them, in small committed chunks so a purge never
+	holds locks long enough to stall ingest.
+	"""
+	settings = frappe.get_cached_doc("Cold Storage Settings")
+	budget = MAX_CHUNKS_PER_RUN
+
+	reading_days = cint(settings.reading_retention_days)
+	if reading_days:
+		budget = purge_readings(add_days(nowdate(), -reading_days), budget, cint(settings.archive_expired_readings))
+
+	for resolution, days in (
+		("Minute", cint(settings.minute_rollup_retention_days)),
+		("Hour", cint(settings.hour_rollup_retention_days)),
+		("Day", cint(settings.day_rollup_retention_days)),
+	):
+		if days and budget > 0:
+			budget = delete_in_chunks("""
+				DELETE FROM `tabCold Storage Environment Rollup`
+				WHERE resolution = %(resolution)s AND bucket < %(cutoff)s
+				LIMIT %(limit)s
+			""", {"resolution": resolution, "cutoff": add_days(nowdate(), -days)}, budget)
+
+def purge_readings(cutoff, budget, archive=False):
+	"""
+	Delete raw readings before cutoff, oldest day first, archiving each day
+	first if asked to; returns the remaining chunk budget.
+	A purge watermark (Cold Storage Settings > Readings Purged Before) is
+	moved past a day before any of its readings are deleted. Days behind it
+	(cut short by the budget or a killed job, or receiving late readings) are
+	only archived and deleted, never rolled up again from what is left.
+	"""
+	watermark = frappe.db.get_single_value("Cold Storage Settings", "readings_purged_before")
+	watermark = get_datetime(watermark) if watermark else None
+
+	while budget > 0:
+		oldest = frappe.db.sql("""
+			SELECT MIN(timestamp) FROM `tabCold Storage Environment Reading`
+			WHERE timestamp < %s
+		""", (cutoff,))[0][0]
+		if not oldest:
+			break
+
+		day = getdate(oldest)
+		day_end = get_datetime(min(add_days(day, 1), getdate(cutoff)))
+		is_new_day = not watermark or day_end > watermark
+		if is_new_day:
+			confirm_rollups(day)
+		if archive:
+			archive_readings(day, day_end)
+		if is_new_day:
+			watermark = day_end
+			frappe.db.set_single_value("Cold Storage Settings", "readings_purged_before", watermark)
+			frappe.db.commit()
+
+		budget = delete_in_chunks("""
+			DELETE FROM `tabCold Storage Environment Reading`
+			WHERE timestamp < %(day_end)s
+			LIMIT %(limit)s
+		""", {"day_end": day_end}, budget)
+
+	return budget
+
+def confirm_rollups(day):
+	"""
+	Rebuild a day's rollups if raw readings are missing from them. Only called
+	for days not yet purged, whose raw readings are still complete; fewer raw
+	readings than rolled up is never repaired from the raw table.
+	"""
+	missing = frappe.db.sql("""
+		SELECT raw.sensor
+		FROM (
+			SELECT sensor, COUNT(*) as reading_count
+			FROM `tabCold Storage Environment Reading`
+			WHERE timestamp >= %(day)s AND timestamp < %(next_day)s
+			GROUP BY sensor
+		) raw
+		LEFT JOIN `tabCold Storage Environment Rollup` d
+			ON d.sensor = raw.sensor AND d.resolution = 'Day' AND d.bucket = %(day)s
+		WHERE raw.reading_count > IFNULL(d.reading_count, 0)
+		LIMIT 1
+	""", {"day": day, "next_day": add_days(day, 1)})
+
+	if missing:
+		rebuild_environment_rollups(day, day)
+		frappe.db.commit()
+
+def delete_in_chunks(query, values, budget):
+	while budget > 0:
+		frappe.db.sql(query, {**values, "limit": DELETE_CHUNK_SIZE})
+		deleted = frappe.db._cursor.rowcount
+		frappe.db.commit()
+		budget -= 1
+		if deleted < DELETE_CHUNK_SIZE:
+			break
+	return budget
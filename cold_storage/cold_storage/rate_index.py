@@ -0,0 +1,127 @@
+import frappe
+from frappe.utils import flt, getdate
+
+RATE_INDEX_CACHE_KEY = "cold_storage_rate_index"
+
+
+def get_rate_index():
+	"""
+	Return the compiled rate index, building it on first use.
+	Cached in the site cache until a Rate Card, Season, Customer Tier or
+	Cold Storage Settings is changed (see clear_rate_index).
+	"""
+	index = frappe.cache.get_value(RATE_INDEX_CACHE_KEY)
+	if index is None:
+		index = build_rate_index()
+		frappe.cache.set_value(RATE_INDEX_CACHE_KEY, index)
+	return index
+
+def clear_rate_index(doc=None, method=None):
+	frappe.cache.delete_value(RATE_INDEX_CACHE_KEY)
+
+
+def build_rate_index():
+	"""
+	Compile every active Rate Card, its Season window, Customer Tier and
+	Bag Type Rate rows (plus the Settings fallback table) into:
+	{
+		"cards": {(billing_type, item_group): [card entry, ...] in priority order},
+		"default": {(billing_type, item_group): {"specific": {goods_item: rates}, "generic": rates}}
+	}
+	"""
+	rate_cards = frappe.get_all("Cold Storage Rate Card",
+		filters={
+			"is_active": 1,
+			"docstatus": ["<", 2]
+		},
+		fields=["name", "priority", "season", "customer_tier", "valid_from", "valid_to"],
+		order_by="priority desc"
+	)
+
+	seasons = {}
+	season_names = list({card.season for card in rate_cards if card.season})
+	if season_names:
+		for s in frappe.get_all("Cold Storage Season",
+			filters={"name": ["in", season_names]},
+			fields=["name", "from_date", "to_date"]
+		):
+			seasons[s.name] = s
+
+	card_rates = get_rate_rows("Cold Storage Rate Card", [card.name for card in rate_cards])
+
+	cards = {}
+	for card in rate_cards:
+		season = seasons.get(card.season) if card.season else None
+		entry_meta = {
+			"name": card.name,
+			"customer_tier": card.customer_tier,
+			"season_from": getdate(season.from_date) if season else None,
+			"season_to": getdate(season.to_date) if season else None,
+			"valid_from": getdate(card.valid_from) if card.valid_from else None,
+			"valid_to": getdate(card.valid_to) if card.valid_to else None,
+		}
+		for key, rates in card_rates.get(card.name, {}).items():
+			cards.setdefault(key, []).append({**entry_meta, **rates})
+
+	default = get_rate_rows("Cold Storage Settings", ["Cold Storage Settings"]).get("Cold Storage Settings", {})
+
+	return {"cards": cards, "default": default}
+
+def get_rate_rows(parenttype, parents):
+	"""Group Bag Type Rate rows as {parent: {(billing_type, item_group): {"specific", "generic"}}}"""
+	if not parents:
+		return {}
+
+	rows = frappe.db.sql("""
+		SELECT parent, goods_item, item_group, billing_type, rate, loading_rate
+		FROM `tabBag Type Rate`
+		WHERE parenttype = %(parenttype)s AND parent IN %(parents)s
+		ORDER BY parent, idx
+	""", {"parenttype": parenttype, "parents": tuple(parents)}, as_dict=True)
+
+	grouped = {}
+	for row in rows:
+		key = (row.billing_type, row.item_group)
+		bucket = grouped.setdefault(row.parent, {}).setdefault(key, {"specific": {}, "generic": None})
+		rates = {"handling": flt(row.rate), "loading": flt(row.loading_rate)}
+
+		# First matching row in table order wins, as in a linear scan
+		if row.goods_item:
+			bucket["specific"].setdefault(row.goods_item, rates)
+		elif bucket["generic"] is None:
+			bucket["generic"] = rates
+
+	return grouped
+
+
+def lookup_rates(index, item_group, billing_type, goods_item=None, customer_tier=None, doc_date=None):
+	"""
+	Resolve rates from a compiled index. Cards are tried in priority order;
+	within a card a goods_item-specific row wins over the generic row.
+	Returns None if neither a card nor Settings define a rate.
+	"""
+	key = (billing_type, item_group)
+
+	for card in index["cards"].get(key, []):
+		if card["season_from"] and not (card["season_from"] <= doc_date <= card["season_to"]):
+			continue
+		if card["customer_tier"] and card["customer_tier"] != customer_tier:
+			continue
+		if card["valid_from"] and card["valid_from"] > doc_date:
+			continue
+		if card["valid_to"] and card["valid_to"] < doc_date:
+			continue
+
+		rates = match_rates(card, goods_item)
+		if rates:
+			return rates
+
+	default = index["default"].get(key)
+	return match_rates(default, goods_item) if default else None
+
+def match_rates(bucket, goods_item=None):
+	if goods_item and goods_item in bucket["specific"]:
+		return dict(bucket["specific"][goods_item])
+	if bucket["generic"]:
+		return dict(bucket["generic"])
+	return None
@@ -12,36 +12,23 @@ def execute(filters=None):
         {"label": _("Net Movement"), "fieldname": "net", "fieldtype": "Int", "width": 120}
     ]
     
-    # 1. Fetch Receipts (Inflow)
-    conditions_in = ""
-    if filters.get("from_date"): conditions_in += f" AND receipt_date >= '{filters.get('from_date')}'"
-    if filters.get("to_date"): conditions_in += f" AND receipt_date <= '{filters.get('to_date')}'"
+    # 1. Daily movement from the Cold Storage Daily Stat rows
+    conditions = ""
+    if filters.get("from_date"): conditions += " AND date >= %(from_date)s"
+    if filters.get("to_date"): conditions += " AND date <= %(to_date)s"
 
-    receipts = frappe.db.sql(f"""
-        SELECT p.receipt_date as date, SUM(c.number_of_bags) as qty
-        FROM `tabCold Storage Receipt` p
-        JOIN `tabCold Storage Receipt Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 {conditions_in}
-        GROUP BY p.receipt_date
-    """, as_dict=True)
+    stats = frappe.db.sql(f"""
+        SELECT date,
+            SUM(intake_bags + transfer_intake_bags) as incoming,
+            SUM(outtake_bags + transfer_outtake_bags) as outgoing
+        FROM `tabCold Storage Daily Stat`
+        WHERE 1 = 1 {conditions}
+        GROUP BY date
+    """, filters, as_dict=True)
 
-    # 2. Fetch Dispatches (Outflow)
-    conditions_out = ""
-    if filters.get("from_date"): conditions_out += f" AND dispatch_date >= '{filters.get('from_date')}'"
-    if filters.get("to_date"): conditions_out += f" AND dispatch_date <= '{filters.get('to_date')}'"
-    
-    # Dispatch uses 'total_packages' or we sum items? Let's check dispatch tables.
-    # Assuming 'Cold Storage Dispatch' has date field 'dispatch_date' 
-    # and items with 'qty' or 'number_of_bags'. 
-    # Let's verify Dispatch fields in a moment, but assuming standard structure based on Receipt.
-    
-    dispatches = frappe.db.sql(f"""
-        SELECT p.dispatch_date as date, SUM(c.number_of_bags) as qty
-        FROM `tabCold Storage Dispatch` p
-        JOIN `tabCold Storage Dispatch Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 {conditions_out}
-        GROUP BY p.dispatch_date
-    """, as_dict=True)
+    # 2. Split into Inflow and Outflow
+    receipts = [frappe._dict({"date": r.date, "qty": r.incoming}) for r in stats if r.incoming]
+    dispatches = [frappe._dict({"date": r.date, "qty": r.outgoing}) for r in stats if r.outgoing]
 
     # 3. Merge Data
     data_map = {}
@@ -14,29 +14,23 @@ def execute(filters=None):
     # Base conditions
     conditions = ""
     if filters.get("from_date"):
-        conditions += f" AND p.receipt_date >= '{filters.get('from_date')}'"
+        conditions += " AND date >= %(from_date)s"
     if filters.get("to_date"):
-        conditions += f" AND p.receipt_date <= '{filters.get('to_date')}'"
+        conditions += " AND date <= %(to_date)s"
 
-    # Get Distinct Types
-    distinct_types = frappe.db.sql(f"""
-        SELECT DISTINCT c.item_group
-        FROM `tabCold Storage Receipt` p
-        JOIN `tabCold Storage Receipt Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 AND p.receipt_type != 'Warehouse Transfer' AND p.receipt_type != 'Customer Transfer' {conditions}
-    """, as_dict=True)
-    
-    item_groups = sorted([d.get("item_group") for d in distinct_types if d.get("item_group")])
-    
-    # Always include 'Unspecified' if there are nulls, or if we want to show it.
-    # Let's check if there are nulls.
-    check_nulls = frappe.db.sql(f"""
-        SELECT 1 FROM `tabCold Storage Receipt` p
-        JOIN `tabCold Storage Receipt Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 AND (c.item_group IS NULL OR c.item_group = '') {conditions}
-        LIMIT 1
-    """)
-    if check_nulls:
+    # Bags per day and item group from the Cold Storage Daily Stat rows
+    # (transfer receipts are counted separately, in transfer_intake_bags)
+    raw_data = frappe.db.sql(f"""
+        SELECT date as receipt_date, item_group, SUM(intake_bags) as qty
+        FROM `tabCold Storage Daily Stat`
+        WHERE 1 = 1 {conditions}
+        GROUP BY date, item_group
+        HAVING qty != 0
+        ORDER BY date ASC
+    """, filters, as_dict=True)
+
+    item_groups = sorted(set(d.get("item_group") for d in raw_data if d.get("item_group")))
+    if any(not d.get("item_group") for d in raw_data):
         item_groups.append("Unspecified")
 
     # Define Columns
@@ -51,16 +45,6 @@ def execute(filters=None):
             "width": 100
         })
 
-    # 2. Aggregate Data
-    raw_data = frappe.db.sql(f"""
-        SELECT p.receipt_date, c.item_group, SUM(c.number_of_bags) as qty
-        FROM `tabCold Storage Receipt` p
-        JOIN `tabCold Storage Receipt Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 AND p.receipt_type != 'Warehouse Transfer' AND p.receipt_type != 'Customer Transfer' {conditions}
-        GROUP BY p.receipt_date, c.item_group
-        ORDER BY p.receipt_date ASC
-    """, as_dict=True)
-    
     # Pivot
     from collections import defaultdict
     pivot = defaultdict(lambda: {bt: 0 for bt in item_groups})
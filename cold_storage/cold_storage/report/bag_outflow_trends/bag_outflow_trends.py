@@ -7,27 +7,23 @@ def execute(filters=None):
     # Base conditions
     conditions = ""
     if filters.get("from_date"):
-        conditions += f" AND p.dispatch_date >= '{filters.get('from_date')}'"
+        conditions += " AND date >= %(from_date)s"
     if filters.get("to_date"):
-        conditions += f" AND p.dispatch_date <= '{filters.get('to_date')}'"
+        conditions += " AND date <= %(to_date)s"
 
-    # Get Distinct Types from Dispatches
-    distinct_types = frappe.db.sql(f"""
-        SELECT DISTINCT c.item_group
-        FROM `tabCold Storage Dispatch` p
-        JOIN `tabCold Storage Dispatch Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 AND (p.remarks IS NULL OR p.remarks NOT LIKE 'Auto-generated Transfer%') {conditions}
-    """, as_dict=True)
-    
-    item_groups = sorted([d.get("item_group") for d in distinct_types if d.get("item_group")])
-    
-    check_nulls = frappe.db.sql(f"""
-        SELECT 1 FROM `tabCold Storage Dispatch` p
-        JOIN `tabCold Storage Dispatch Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 AND (c.item_group IS NULL OR c.item_group = '') {conditions}
-        LIMIT 1
-    """)
-    if check_nulls:
+    # Bags per day and item group from the Cold Storage Daily Stat rows
+    # (dispatches generated by transfers are counted separately, in transfer_outtake_bags)
+    raw_data = frappe.db.sql(f"""
+        SELECT date as dispatch_date, item_group, SUM(outtake_bags) as qty
+        FROM `tabCold Storage Daily Stat`
+        WHERE 1 = 1 {conditions}
+        GROUP BY date, item_group
+        HAVING qty != 0
+        ORDER BY date ASC
+    """, filters, as_dict=True)
+
+    item_groups = sorted(set(d.get("item_group") for d in raw_data if d.get("item_group")))
+    if any(not d.get("item_group") for d in raw_data):
         item_groups.append("Unspecified")
 
     # Define Columns
@@ -42,16 +38,6 @@ def execute(filters=None):
             "width": 100
         })
 
-    # 2. Aggregate Data
-    raw_data = frappe.db.sql(f"""
-        SELECT p.dispatch_date, c.item_group, SUM(c.number_of_bags) as qty
-        FROM `tabCold Storage Dispatch` p
-        JOIN `tabCold Storage Dispatch Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 AND (p.remarks IS NULL OR p.remarks NOT LIKE 'Auto-generated Transfer%') {conditions}
-        GROUP BY p.dispatch_date, c.item_group
-        ORDER BY p.dispatch_date ASC
-    """, as_dict=True)
-    
     # Pivot
     from collections import defaultdict
     pivot = defaultdict(lambda: {bt: 0 for bt in item_groups})
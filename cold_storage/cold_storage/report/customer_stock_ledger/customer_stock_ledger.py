@@ -21,74 +21,68 @@ def execute(filters=None):
 		{"label": _("Cumulative Balance"), "fieldname": "cumulative_balance", "fieldtype": "Int", "width": 140},
 	]
 
-	data = []
-	
-	conditions = ""
+	conditions = []
+	values = {"today": frappe.utils.today()}
 	if filters.get("customer"):
-		conditions += f" AND p.customer = '{filters.get('customer')}'"
+		conditions.append("p.customer = %(customer)s")
+		values["customer"] = filters.get("customer")
 	if filters.get("batch_no"):
-		conditions += f" AND c.batch_no LIKE '%{filters.get('batch_no')}%'"
+		conditions.append("c.batch_no LIKE %(batch_no)s")
+		values["batch_no"] = f"%{filters.get('batch_no')}%"
 	if filters.get("warehouse"):
-		conditions += f" AND p.warehouse = '{filters.get('warehouse')}'"
+		conditions.append("p.warehouse = %(warehouse)s")
+		values["warehouse"] = filters.get("warehouse")
 	if filters.get("item_group"):
-		conditions += f" AND c.item_group = '{filters.get('item_group')}'"
+		conditions.append("c.item_group = %(item_group)s")
+		values["item_group"] = filters.get("item_group")
 	if filters.get("item_code"):
-		conditions += f" AND c.goods_item = '{filters.get('item_code')}'"
+		conditions.append("c.goods_item = %(item_code)s")
+		values["item_code"] = filters.get("item_code")
 	if filters.get("from_date"):
-		conditions += f" AND p.receipt_date >= '{filters.get('from_date')}'"
+		conditions.append("p.receipt_date >= %(from_date)s")
+		values["from_date"] = filters.get("from_date")
 	if filters.get("to_date"):
-		conditions += f" AND p.receipt_date <= '{filters.get('to_date')}'"
-    
-	# Fetch Receipts from Child Table
-	receipts = frappe.db.sql(f"""
-		SELECT 
-            p.name as receipt, p.customer, p.warehouse, c.goods_item as item, c.item_group, c.batch_no, p.receipt_date, c.number_of_bags as in_qty 
-        FROM `tabCold Storage Receipt` p
-        JOIN `tabCold Storage Receipt Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 {conditions}
-	""", as_dict=True)
-
-	total_in_qty = 0
-	total_out_qty = 0
-	total_balance = 0
-	cumulative_balance = 0
-
-	for r in receipts:
-		# Calculate Out Qty from Dispatches
-		out_qty = frappe.db.sql("""
-			SELECT SUM(d_item.number_of_bags) 
-			FROM `tabCold Storage Dispatch` d
-			JOIN `tabCold Storage Dispatch Item` d_item ON d_item.parent = d.name
-			WHERE d.docstatus = 1 AND d_item.linked_receipt = %s AND d_item.batch_no = %s
-		""", (r.receipt, r.batch_no), as_dict=False)[0][0] or 0
-		
-		balance = r.in_qty - out_qty
-		
-		days = frappe.utils.date_diff(frappe.utils.today(), r.receipt_date)
+		conditions.append("p.receipt_date <= %(to_date)s")
+		values["to_date"] = filters.get("to_date")
 
-		if balance == 0 and not filters.get("show_zero_balance"):
-			continue
+	where_clause = "".join(f" AND {c}" for c in conditions)
+	balance_clause = "" if filters.get("show_zero_balance") else "WHERE t.balance != 0"
 
-		cumulative_balance += balance
-			
-		data.append({
-			"receipt_date": r.receipt_date,
-			"receipt": r.receipt,
-			"customer": r.customer,
-			"item": r.item,
-			"item_group": r.item_group,
-			"batch_no": r.batch_no,
-			"warehouse": r.warehouse,
-			"days_in_store": days,
-			"in_qty": r.in_qty,
-			"out_qty": out_qty,
-			"balance": balance,
-			"cumulative_balance": cumulative_balance
-		})
+	# Dispatches are aggregated once per (receipt, batch) and joined in;
+	# days in store and the running balance are computed in SQL.
+	data = frappe.db.sql(f"""
+		SELECT
+			t.receipt_date, t.receipt, t.customer, t.item, t.item_group, t.batch_no, t.warehouse,
+			t.days_in_store, t.in_qty, t.out_qty, t.balance,
+			SUM(t.balance) OVER (
+				ORDER BY t.receipt_date, t.receipt, t.row_idx
+				ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+			) as cumulative_balance
+		FROM (
+			SELECT
+				p.receipt_date, p.name as receipt, p.customer, c.goods_item as item, c.item_group,
+				c.batch_no, p.warehouse, c.idx as row_idx,
+				DATEDIFF(%(today)s, p.receipt_date) as days_in_store,
+				c.number_of_bags as in_qty,
+				IFNULL(d.out_qty, 0) as out_qty,
+				c.number_of_bags - IFNULL(d.out_qty, 0) as balance
+			FROM `tabCold Storage Receipt` p
+			JOIN `tabCold Storage Receipt Item` c ON c.parent = p.name
+			LEFT JOIN (
+				SELECT d_item.linked_receipt, d_item.batch_no, SUM(d_item.number_of_bags) as out_qty
+				FROM `tabCold Storage Dispatch Item` d_item
+				WHERE d_item.docstatus = 1
+				GROUP BY d_item.linked_receipt, d_item.batch_no
+			) d ON d.linked_receipt = p.name AND d.batch_no = c.batch_no
+			WHERE p.docstatus = 1 {where_clause}
+		) t
+		{balance_clause}
+		ORDER BY t.receipt_date, t.receipt, t.row_idx
+	""", values, as_dict=True)
 
-		total_in_qty += flt(r.in_qty)
-		total_out_qty += flt(out_qty)
-		total_balance += flt(balance)
+	total_in_qty = sum(flt(r.in_qty) for r in data)
+	total_out_qty = sum(flt(r.out_qty) for r in data)
+	total_balance = sum(flt(r.balance) for r in data)
 
 	if data:
 		data.append({
@@ -28,6 +28,13 @@ frappe.query_reports["Inventory Aging"] = {
             "default": 30,
             "description": "Stock older than this will be marked as Overdue"
         },
+        {
+            "fieldname": "age_buckets",
+            "label": __("Age Buckets (Days)"),
+            "fieldtype": "Data",
+            "default": "7, 30, 60, 90",
+            "description": "Comma-separated upper bounds of each age bucket"
+        },
         {
             "fieldname": "min_age_days",
             "label": __("Min Age (Days)"),
@@ -72,9 +79,10 @@ frappe.query_reports["Inventory Aging"] = {
         }
 
         if (column.fieldname === "age_bucket" && data) {
-            if (data.age_bucket === "90+ days") {
+            // bucket_rank 0 is the oldest bucket, 1 the one before it
+            if (data.bucket_rank === 0) {
                 value = `<span style="background: #ffebee; padding: 2px 6px; border-radius: 3px; color: #c0392b;">${value}</span>`;
-            } else if (data.age_bucket === "61-90 days") {
+            } else if (data.bucket_rank === 1) {
                 value = `<span style="background: #fff3e0; padding: 2px 6px; border-radius: 3px; color: #e67e22;">${value}</span>`;
             }
         }
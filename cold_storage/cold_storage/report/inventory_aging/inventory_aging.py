@@ -3,9 +3,10 @@
 
 import frappe
 from frappe import _
-from frappe.utils import today, date_diff, getdate
+from frappe.utils import today, cint, flt
 
 def execute(filters=None):
+    filters = frappe._dict(filters or {})
     columns = get_columns()
     data = get_data(filters)
     chart = get_chart(data, filters)
@@ -25,118 +26,139 @@ def get_columns():
         {"label": _("Status"), "fieldname": "status", "fieldtype": "Data", "width": 100},
     ]
 
-def get_data(filters):
+DEFAULT_AGE_BUCKETS = [7, 30, 60, 90]
+
+def get_bucket_boundaries(filters):
+    """Parse the 'Age Buckets (Days)' filter, e.g. "7, 30, 60, 90" """
+    boundaries = []
+    for part in str(filters.get("age_buckets") or "").split(","):
+        part = part.strip()
+        if part.isdigit() and int(part) > 0:
+            boundaries.append(int(part))
+    return sorted(set(boundaries)) or DEFAULT_AGE_BUCKETS
+
+def get_bucket_labels(boundaries):
+    labels = []
+    lower = 0
+    for upper in boundaries:
+        labels.append(f"{lower}-{upper} days")
+        lower = upper + 1
+    labels.append(f"{boundaries[-1]}+ days")
+    return labels
+
+def get_aging_query(filters):
+    """
+    Build the aggregated aging query: balance per receipt line (dispatches
+    pre-aggregated per receipt + batch), age, age bucket and threshold
+    status, with the balance and age filters applied in SQL.
+    """
+    boundaries = get_bucket_boundaries(filters)
+    labels = get_bucket_labels(boundaries)
+    threshold = cint(filters.get("threshold_days")) or 30
+
+    values = {
+        "today": today(),
+        "threshold": threshold,
+        "warning": threshold * 0.8,  # 80% of threshold = warning
+        "overdue_label": "⚠️ Overdue",
+        "warning_label": "⏳ Warning",
+        "fresh_label": "✅ Fresh",
+    }
+
+    bucket_cases = []
+    for i, upper in enumerate(boundaries):
+        values[f"bucket_{i}"] = upper
+        values[f"bucket_label_{i}"] = labels[i]
+        # Rank 0 is the oldest bucket, used by the formatter for highlighting
+        values[f"bucket_rank_{i}"] = len(boundaries) - i
+        bucket_cases.append(f"WHEN a.age_days <= %(bucket_{i})s THEN %(bucket_label_{i})s")
+    values["bucket_label_last"] = labels[-1]
+
+    rank_cases = [f"WHEN a.age_days <= %(bucket_{i})s THEN %(bucket_rank_{i})s" for i in range(len(boundaries))]
+
     conditions = ""
     if filters.get("customer"):
-        conditions += f" AND r.customer = '{filters.get('customer')}'"
+        conditions += " AND r.customer = %(customer)s"
+        values["customer"] = filters.get("customer")
     if filters.get("warehouse"):
-        conditions += f" AND r.warehouse = '{filters.get('warehouse')}'"
+        conditions += " AND r.warehouse = %(warehouse)s"
+        values["warehouse"] = filters.get("warehouse")
     if filters.get("item"):
-        conditions += f" AND ri.goods_item = '{filters.get('item')}'"
-    
-    # Fetch all submitted receipts with items
-    receipts = frappe.db.sql(f"""
-        SELECT 
-            r.name as receipt, 
-            r.customer, 
-            r.warehouse, 
-            r.receipt_date,
-            ri.goods_item as item, 
-            ri.batch_no, 
-            ri.number_of_bags as in_qty
-        FROM `tabCold Storage Receipt` r
-        JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
-        WHERE r.docstatus = 1 {conditions}
-        ORDER BY r.receipt_date ASC
-    """, as_dict=True)
-    
-    data = []
-    threshold = filters.get("threshold_days") or 30
-    today_date = getdate(today())
-    
-    for r in receipts:
-        # Calculate dispatched quantity for this receipt + batch
-        out_qty = frappe.db.sql("""
-            SELECT COALESCE(SUM(di.number_of_bags), 0)
-            FROM `tabCold Storage Dispatch` d
-            JOIN `tabCold Storage Dispatch Item` di ON di.parent = d.name
-            WHERE d.docstatus = 1 AND di.linked_receipt = %s AND di.batch_no = %s
-        """, (r.receipt, r.batch_no))[0][0] or 0
-        
-        balance = r.in_qty - out_qty
-        
-        # Skip zero balance items unless explicitly requested
-        if balance <= 0 and not filters.get("show_zero_balance"):
-            continue
-        
-        age_days = date_diff(today_date, r.receipt_date)
-        age_bucket = get_age_bucket(age_days)
-        
-        # Determine status based on threshold
-        if age_days > threshold:
-            status = "⚠️ Overdue"
-        elif age_days > (threshold * 0.8):  # 80% of threshold = warning
-            status = "⏳ Warning"
-        else:
-            status = "✅ Fresh"
-        
-        # Apply age filter if specified
-        min_age = filters.get("min_age_days") or 0
-        max_age = filters.get("max_age_days")
-        
-        if age_days < min_age:
-            continue
-        if max_age and age_days > max_age:
-            continue
-        
-        data.append({
-            "customer": r.customer,
-            "receipt": r.receipt,
-            "receipt_date": r.receipt_date,
-            "item": r.item,
-            "batch_no": r.batch_no,
-            "warehouse": r.warehouse,
-            "balance_qty": balance,
-            "age_days": age_days,
-            "age_bucket": age_bucket,
-            "status": status
-        })
-    
+        conditions += " AND ri.goods_item = %(item)s"
+        values["item"] = filters.get("item")
+
+    # Skip zero balance items unless explicitly requested
+    outer_conditions = []
+    if not filters.get("show_zero_balance"):
+        outer_conditions.append("a.balance_qty > 0")
+
+    # Apply age filter if specified
+    values["min_age"] = cint(filters.get("min_age_days"))
+    outer_conditions.append("a.age_days >= %(min_age)s")
+    if filters.get("max_age_days"):
+        values["max_age"] = cint(filters.get("max_age_days"))
+        outer_conditions.append("a.age_days <= %(max_age)s")
+
+    query = f"""
+        SELECT
+            a.*,
+            CASE {" ".join(bucket_cases)} ELSE %(bucket_label_last)s END as age_bucket,
+            CASE {" ".join(rank_cases)} ELSE 0 END as bucket_rank,
+            CASE
+                WHEN a.age_days > %(threshold)s THEN %(overdue_label)s
+                WHEN a.age_days > %(warning)s THEN %(warning_label)s
+                ELSE %(fresh_label)s
+            END as status
+        FROM (
+            SELECT
+                r.customer,
+                r.name as receipt,
+                r.receipt_date,
+                ri.goods_item as item,
+                ri.batch_no,
+                r.warehouse,
+                ri.number_of_bags - IFNULL(d.out_qty, 0) as balance_qty,
+                DATEDIFF(%(today)s, r.receipt_date) as age_days
+            FROM `tabCold Storage Receipt` r
+            JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
+            LEFT JOIN (
+                SELECT di.linked_receipt, di.batch_no, SUM(di.number_of_bags) as out_qty
+                FROM `tabCold Storage Dispatch Item` di
+                WHERE di.docstatus = 1
+                GROUP BY di.linked_receipt, di.batch_no
+            ) d ON d.linked_receipt = r.name AND d.batch_no = ri.batch_no
+            WHERE r.docstatus = 1 {conditions}
+        ) a
+        WHERE {" AND ".join(outer_conditions)}
+    """
+
+    return query, values, labels
+
+def get_data(filters):
+    query, values, labels = get_aging_query(filters)
+
     # Sort by age descending (oldest first) to highlight aging stock
-    data.sort(key=lambda x: x["age_days"], reverse=True)
-    
-    return data
-
-def get_age_bucket(age_days):
-    """Categorize age into buckets for easy analysis"""
-    if age_days <= 7:
-        return "0-7 days"
-    elif age_days <= 30:
-        return "8-30 days"
-    elif age_days <= 60:
-        return "31-60 days"
-    elif age_days <= 90:
-        return "61-90 days"
-    else:
-        return "90+ days"
+    return frappe.db.sql(f"""
+        SELECT * FROM ({query}) aging
+        ORDER BY aging.age_days DESC, aging.receipt_date ASC
+    """, values, as_dict=True)
 
 def get_chart(data, filters):
     """Generate a bar chart showing stock distribution by age bucket"""
     if not data:
         return None
-    
-    # Aggregate quantities by age bucket
-    bucket_totals = {}
-    bucket_order = ["0-7 days", "8-30 days", "31-60 days", "61-90 days", "90+ days"]
-    
-    for bucket in bucket_order:
-        bucket_totals[bucket] = 0
-    
-    for row in data:
-        bucket = row.get("age_bucket")
+
+    # Aggregate quantities by age bucket in SQL
+    query, values, bucket_order = get_aging_query(filters)
+    bucket_totals = {bucket: 0 for bucket in bucket_order}
+    for bucket, qty in frappe.db.sql(f"""
+        SELECT aging.age_bucket, SUM(aging.balance_qty)
+        FROM ({query}) aging
+        GROUP BY aging.age_bucket
+    """, values):
         if bucket in bucket_totals:
-            bucket_totals[bucket] += row.get("balance_qty", 0)
-    
+            bucket_totals[bucket] = flt(qty)
+
     return {
         "data": {
             "labels": bucket_order,
@@ -13,31 +13,23 @@ def execute(filters=None):
         {"label": _("Net Movement"), "fieldname": "net", "fieldtype": "Int", "width": 120}
     ]
     
-    # 1. Fetch Receipts (Inflow)
-    conditions_in = ""
-    if filters.get("from_date"): conditions_in += f" AND p.receipt_date >= '{filters.get('from_date')}'"
-    if filters.get("to_date"): conditions_in += f" AND p.receipt_date <= '{filters.get('to_date')}'"
+    # 1. Monthly movement per item group from the Cold Storage Daily Stat rows
+    conditions = ""
+    if filters.get("from_date"): conditions += " AND date >= %(from_date)s"
+    if filters.get("to_date"): conditions += " AND date <= %(to_date)s"
 
-    receipts = frappe.db.sql(f"""
-        SELECT DATE_FORMAT(p.receipt_date, '%Y-%m') as month, c.item_group, SUM(c.number_of_bags) as qty
-        FROM `tabCold Storage Receipt` p
-        JOIN `tabCold Storage Receipt Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 {conditions_in}
-        GROUP BY month, c.item_group
-    """, as_dict=True)
+    stats = frappe.db.sql(f"""
+        SELECT DATE_FORMAT(date, '%%Y-%%m') as month, item_group,
+            SUM(intake_bags + transfer_intake_bags) as incoming,
+            SUM(outtake_bags + transfer_outtake_bags) as outgoing
+        FROM `tabCold Storage Daily Stat`
+        WHERE 1 = 1 {conditions}
+        GROUP BY month, item_group
+    """, filters, as_dict=True)
 
-    # 2. Fetch Dispatches (Outflow)
-    conditions_out = ""
-    if filters.get("from_date"): conditions_out += f" AND p.dispatch_date >= '{filters.get('from_date')}'"
-    if filters.get("to_date"): conditions_out += f" AND p.dispatch_date <= '{filters.get('to_date')}'"
-    
-    dispatches = frappe.db.sql(f"""
-        SELECT DATE_FORMAT(p.dispatch_date, '%Y-%m') as month, c.item_group, SUM(c.number_of_bags) as qty
-        FROM `tabCold Storage Dispatch` p
-        JOIN `tabCold Storage Dispatch Item` c ON c.parent = p.name
-        WHERE p.docstatus = 1 {conditions_out}
-        GROUP BY month, c.item_group
-    """, as_dict=True)
+    # 2. Split into Inflow and Outflow
+    receipts = [frappe._dict({"month": r.month, "item_group": r.item_group, "qty": r.incoming}) for r in stats if r.incoming]
+    dispatches = [frappe._dict({"month": r.month, "item_group": r.item_group, "qty": r.outgoing}) for r in stats if r.outgoing]
 
     # 3. Merge Data
     data_map = {}
@@ -0,0 +1,187 @@
+import json
+
+import frappe
+from frappe.utils import now_datetime, get_datetime, time_diff_in_seconds
+
+SENSOR_QUEUE_KEY = "cold_storage_sensor_queue"
+SENSOR_PROCESSING_KEY = "cold_storage_sensor_queue_processing"
+SENSOR_FAILED_QUEUE_KEY = "cold_storage_sensor_queue_failed"
+SENSOR_DRAIN_LOCK_KEY = "cold_storage_sensor_queue_drain_lock"
+SENSOR_QUEUE_STATS_KEY = "cold_storage_sensor_queue_stats"
+DRAIN_CHUNK_SIZE = 500
+DRAIN_MAX_CHUNKS = 100
+# Renewed after every chunk; only expires if the drainer dies
+DRAIN_LOCK_TIMEOUT = 300
+
+
+def get_queue_connection():
+	"""
+	The queue lives on the background job Redis, not the site cache: the
+	cache evicts keys under memory pressure and is not persisted.
+	"""
+	from frappe.utils.background_jobs import get_redis_conn
+
+	return get_redis_conn()
+
+def get_queue_key(name):
+	return f"{frappe.local.site}:{name}"
+
+
+def push_readings(entries):
+	"""
+	Append raw webhook readings to the site's Redis ingest queue, stamped with
+	the time they were received (overriding any client-sent received_at),
+	and make sure a drain job is queued.
+	"""
+	received_at = str(now_datetime())
+	key = get_queue_key(SENSOR_QUEUE_KEY)
+
+	pipe = get_queue_connection().pipeline()
+	for entry in entries:
+		pipe.rpush(key, json.dumps({**entry, "received_at": received_at}, default=str))
+	pipe.execute()
+
+	frappe.enqueue(
+		"cold_storage.cold_storage.sensor_queue.drain_sensor_queue",
+		queue="short",
+		job_id="cold_storage_drain_sensor_queue",
+		deduplicate=True
+	)
+
+def pop_readings(count):
+	"""
+	Move up to `count` readings from the head of the queue to the processing
+	list, where they stay until acknowledged (ack_readings) or failed
+	(fail_readings)
+	"""
+	pipe = get_queue_connection().pipeline(transaction=False)
+	for _i in range(count):
+		pipe.lmove(get_queue_key(SENSOR_QUEUE_KEY), get_queue_key(SENSOR_PROCESSING_KEY), "LEFT", "RIGHT")
+	items = [item for item in pipe.execute() if item is not None]
+
+	return [json.loads(item) for item in items]
+
+def ack_readings():
+	"""Drop the processing list once its readings are committed"""
+	get_queue_connection().delete(get_queue_key(SENSOR_PROCESSING_KEY))
+
+def fail_readings():
+	"""Move the processing list to the failed queue"""
+	move_all(SENSOR_PROCESSING_KEY, SENSOR_FAILED_QUEUE_KEY, "LEFT", "RIGHT")
+
+def recover_readings():
+	"""
+	Put readings left in the processing list by a drainer that died back at
+	the head of the queue, in their original order
+	"""
+	return move_all(SENSOR_PROCESSING_KEY, SENSOR_QUEUE_KEY, "RIGHT", "LEFT")
+
+def move_all(source, destination, source_side, destination_side):
+	conn = get_queue_connection()
+	count = 0
+	while conn.lmove(get_queue_key(source), get_queue_key(destination), source_side, destination_side) is not None:
+		count += 1
+	return count
+
+def drain_sensor_queue():
+	"""
+	Background job (also scheduled every minute as a safety net): persist
+	queued readings in chunks and run threshold checks. A chunk that fails
+	is moved to the failed queue so it cannot block the ones behind it.
+	Only one drainer runs at a time. Readings are only removed from Redis
+	after their chunk is committed, so a drainer killed mid-chunk loses
+	nothing; the next run replays that chunk, and save_readings skips the
+	readings it had already saved.
+	"""
+	from redis.exceptions import LockError
+
+	from cold_storage.cold_storage.api import save_readings
+
+	lock = get_queue_connection().lock(get_queue_key(SENSOR_DRAIN_LOCK_KEY), timeout=DRAIN_LOCK_TIMEOUT)
+	if not lock.acquire(blocking=False):
+		return
+
+	try:
+		recover_readings()
+
+		for _i in range(DRAIN_MAX_CHUNKS):
+			entries = pop_readings(DRAIN_CHUNK_SIZE)
+			if not entries:
+				break
+
+			try:
+				save_readings(entries)
+			except Exception:
+				frappe.db.rollback()
+				frappe.log_error("IoT Ingest Failed", frappe.get_traceback())
+				fail_readings()
+				continue
+			finally:
+				lock.reacquire()
+
+			ack_readings()
+			update_drain_stats(entries)
+	finally:
+		try:
+			lock.release()
+		except LockError:
+			pass
+
+def update_drain_stats(entries):
+	now = now_datetime()
+	oldest = min(get_datetime(e["received_at"]) for e in entries)
+
+	stats = frappe.cache.get_value(SENSOR_QUEUE_STATS_KEY) or {}
+	stats.update({
+		"last_drained_at": now,
+		"last_drain_lag": time_diff_in_seconds(now, oldest),
+		"drained_count": stats.get("drained_count", 0) + len(entries)
+	})
+	frappe.cache.set_value(SENSOR_QUEUE_STATS_KEY, stats)
+
+def requeue_failed_readings():
+	"""
+	Move readings from the failed queue back to the ingest queue once the
+	cause has been fixed. They keep their original received_at.
+	Usage: bench --site [site] execute cold_storage.cold_storage.sensor_queue.requeue_failed_readings
+	"""
+	count = move_all(SENSOR_FAILED_QUEUE_KEY, SENSOR_QUEUE_KEY, "LEFT", "RIGHT")
+	if count:
+		frappe.enqueue(
+			"cold_storage.cold_storage.sensor_queue.drain_sensor_queue",
+			queue="short",
+			job_id="cold_storage_drain_sensor_queue",
+			deduplicate=True
+		)
+	return count
+
+
+@frappe.whitelist()
+def get_sensor_queue_status():
+	"""Queue depth, age of the oldest waiting reading and last drain statistics"""
+	conn = get_queue_connection()
+	head = conn.lrange(get_queue_key(SENSOR_QUEUE_KEY), 0, 0)
+	oldest_age = 0
+	if head:
+		oldest_age = time_diff_in_seconds(now_datetime(), get_datetime(json.loads(head[0])["received_at"]))
+
+	stats = frappe.cache.get_value(SENSOR_QUEUE_STATS_KEY) or {}
+	return {
+		"depth": conn.llen(get_queue_key(SENSOR_QUEUE_KEY)),
+		"processing": conn.llen(get_queue_key(SENSOR_PROCESSING_KEY)),
+		"failed": conn.llen(get_queue_key(SENSOR_FAILED_QUEUE_KEY)),
+		"oldest_age": oldest_age,
+		"last_drained_at": stats.get("last_drained_at"),
+		"last_drain_lag": stats.get("last_drain_lag"),
+		"drained_count": stats.get("drained_count", 0)
+	}
+
+@frappe.whitelist()
+def get_sensor_queue_depth(filters=None):
+	return get_queue_connection().llen(get_queue_key(SENSOR_QUEUE_KEY))
+
+@frappe.whitelist()
+def get_sensor_drain_lag(filters=None):
+	"""Seconds the oldest reading has been waiting, or the last drain's lag if the queue is empty"""
+	status = get_sensor_queue_status()
+	return status["oldest_age"] or status["last_drain_lag"] or 0
@@ -1,6 +1,14 @@
 import frappe
-from frappe.utils import getdate, nowdate, flt, format_date
-from cold_storage.cold_storage import utils
+from frappe.utils import getdate, nowdate, flt, format_date, cint, add_days, now_datetime
+from cold_storage.cold_storage.doctype.cold_storage_daily_stat.cold_storage_daily_stat import get_daily_totals
+from cold_storage.cold_storage.doctype.cold_storage_outbound_message.cold_storage_outbound_message import (
+	enqueue_whatsapp_bulk,
+)
+
+REMINDER_CHUNK_SIZE = 500
+MAX_REMINDER_CHUNKS = 200
+# Invoice numbers listed in a reminder; the rest are summarised as "and N more"
+MAX_REMINDER_INVOICES = 10
 
 def send_daily_summary():
 	"""
@@ -15,49 +23,40 @@ def send_daily_summary():
 
 	today = nowdate()
 	
-	# 1. Aggregate Intake (Receipts)
-	intake_data = frappe.db.sql("""
-		SELECT COUNT(name), SUM(total_bags)
-		FROM `tabCold Storage Receipt`
-		WHERE receipt_date = %s AND docstatus = 1
-	""", (today,))[0]
-	
-	total_receipts = intake_data[0] or 0
-	total_intake_bags = flt(intake_data[1]) or 0
-
-	# 2. Aggregate Outtake (Dispatches)
-	outtake_data = frappe.db.sql("""
-		SELECT COUNT(DISTINCT d.name), SUM(di.number_of_bags)
-		FROM `tabCold Storage Dispatch` d
-		JOIN `tabCold Storage Dispatch Item` di ON di.parent = d.name
-		WHERE d.dispatch_date = %s AND d.docstatus = 1
-	""", (today,))[0]
-	
-	total_dispatches = outtake_data[0] or 0
-	total_outtake_bags = flt(outtake_data[1]) or 0
+	# 1. Today's intake and outtake from the Cold Storage Daily Stat rows
+	stats = get_daily_totals(today, today)
+
+	total_receipts = cint(stats.receipt_count)
+	total_intake_bags = stats.intake_bags + stats.transfer_intake_bags
 
-	# 3. Format Message
+	total_dispatches = cint(stats.dispatch_count)
+	total_outtake_bags = stats.outtake_bags + stats.transfer_outtake_bags
+
+	# 2. Format Message
 	message = f"*Daily Summary - {format_date(today)}*\n\n"
 	message += f"📦 *Intake (Receipts)*\n"
-	message += f"• Total Bags: {intake_data[1] or 0}\n"
+	message += f"• Total Bags: {cint(total_intake_bags)}\n"
 	message += f"• Documents: {total_receipts}\n\n"
 	
 	message += f"🚚 *Outtake (Dispatches)*\n"
-	message += f"• Total Bags: {outtake_data[1] or 0}\n"
+	message += f"• Total Bags: {cint(total_outtake_bags)}\n"
 	message += f"• Documents: {total_dispatches}\n\n"
 	
 	message += f"_Powered by Cold Storage Management System_"
 
-	# 4. Send to Recipients
+	# 3. Queue for Recipients
 	recipients = [r.strip() for r in settings.summary_recipients.split('\n') if r.strip()]
-	for number in recipients:
-		utils.send_whatsapp(number, message)
+	enqueue_whatsapp_bulk([{"recipient": number, "message": message} for number in recipients])
 
-	return "Summary sent to " + ", ".join(recipients)
+	return "Summary queued for " + ", ".join(recipients)
 
 def send_late_payment_reminders():
 	"""
-	Scheduled task to send WhatsApp reminders for overdue Sales Invoices.
+	Scheduled task to send WhatsApp reminders for overdue Sales Invoices,
+	one message per customer covering all their overdue invoices.
+	Customers are processed in chunks; each chunk stamps the customers'
+	last reminder and commits, so a run that dies part way resumes where it
+	stopped and nobody is reminded twice within the configured interval.
 	"""
 	settings = frappe.get_single("Cold Storage WhatsApp Settings")
 	if not settings.enabled or not settings.late_payment_reminders_enabled:
@@ -66,37 +65,78 @@ def send_late_payment_reminders():
 	if not settings.late_payment_message_template:
 		return
 
-	today = nowdate()
-	
-	# Fetch overdue invoices: Submitted, Outstanding > 0, Due Date < Today
-	overdue_invoices = frappe.get_all("Sales Invoice",
-		filters={
-			"docstatus": 1,
-			"outstanding_amount": [">", 0],
-			"due_date": ["<", today]
-		},
-		fields=["name", "customer", "due_date", "outstanding_amount"]
-	)
-
-	sent_count = 0
-	for inv in overdue_invoices:
-		# Use safe access for frappe.get_all results
-		inv = frappe._dict(inv)
-		
-		# Get customer's mobile number
-		mobile_no = frappe.db.get_value("Customer", inv.customer, "mobile_no")
-		if not mobile_no:
-			continue
-
-		# Prepare message
-		message = settings.late_payment_message_template.format(
-			customer_name=inv.customer,
-			invoice_number=inv.name,
-			due_date=format_date(inv.due_date),
-			outstanding_amount=inv.outstanding_amount
-		)
-
-		utils.send_whatsapp(mobile_no, message)
-		sent_count += 1
-
-	return f"Sent {sent_count} reminders"
+	interval = cint(settings.late_payment_reminder_interval_days)
+	reminded_before = add_days(now_datetime(), -interval) if interval else now_datetime()
+
+	queued = 0
+	after = ""
+	for _i in range(MAX_REMINDER_CHUNKS):
+		customers = get_overdue_customers(after, reminded_before)
+		if not customers:
+			break
+
+		messages = []
+		for c in customers:
+			messages.append({
+				"recipient": c.mobile_no,
+				"message": settings.late_payment_message_template.format(
+					customer_name=c.customer_name or c.customer,
+					invoice_number=get_invoice_list(c),
+					invoice_count=c.invoice_count,
+					due_date=format_date(c.oldest_due_date),
+					outstanding_amount=flt(c.total_outstanding, 2)
+				),
+				"reference_doctype": "Customer",
+				"reference_name": c.customer
+			})
+
+		frappe.db.sql("""
+			UPDATE `tabCustomer`
+			SET cold_storage_last_payment_reminder = %(now)s
+			WHERE name IN %(customers)s
+		""", {"now": now_datetime(), "customers": tuple(c.customer for c in customers)})
+		queued += enqueue_whatsapp_bulk(messages)
+		frappe.db.commit()
+
+		after = customers[-1].customer
+
+	return f"Queued {queued} reminders"
+
+def get_overdue_customers(after, reminded_before):
+	"""
+	Next chunk of customers (by name, after `after`) with overdue invoices and a
+	mobile number, not reminded since reminded_before, with their total
+	outstanding and its oldest MAX_REMINDER_INVOICES overdue invoices.
+	"""
+	return frappe.db.sql("""
+		SELECT si.customer, c.customer_name, c.mobile_no,
+			COUNT(si.name) as invoice_count,
+			SUM(si.outstanding_amount) as total_outstanding,
+			MIN(si.due_date) as oldest_due_date,
+			GROUP_CONCAT(si.name ORDER BY si.due_date, si.name SEPARATOR ', ' LIMIT %(max_invoices)s) as invoices
+		FROM `tabSales Invoice` si
+		JOIN `tabCustomer` c ON c.name = si.customer
+		WHERE si.docstatus = 1
+			AND si.outstanding_amount > 0
+			AND si.due_date < %(today)s
+			AND si.customer > %(after)s
+			AND IFNULL(c.mobile_no, '') != ''
+			AND (c.cold_storage_last_payment_reminder IS NULL
+				OR c.cold_storage_last_payment_reminder < %(reminded_before)s)
+		GROUP BY si.customer, c.customer_name, c.mobile_no
+		ORDER BY si.customer
+		LIMIT %(limit)s
+	""", {
+		"today": nowdate(),
+		"after": after,
+		"reminded_before": reminded_before,
+		"limit": REMINDER_CHUNK_SIZE,
+		"max_invoices": MAX_REMINDER_INVOICES
+	}, as_dict=True)
+
+def get_invoice_list(customer):
+	"""The customer's oldest overdue invoice numbers, noting how many are left out"""
+	more = cint(customer.invoice_count) - MAX_REMINDER_INVOICES
+	if more > 0:
+		return f"{customer.invoices} and {more} more"
+	return customer.invoices
@@ -1,4 +1,8 @@
 import frappe
+import json
+
+from cold_storage.cold_storage.doctype.cold_storage_batch_ledger.cold_storage_batch_ledger import get_ledger_name
+from cold_storage.cold_storage.rate_index import get_rate_index, lookup_rates
 
 @frappe.whitelist()
 def get_item_group_filter(doctype, txt, searchfield, start, page_len, filters):
@@ -16,25 +20,15 @@ def get_item_group_filter(doctype, txt, searchfield, start, page_len, filters):
 
 @frappe.whitelist()
 def get_active_batches_count(filters=None):
-        return frappe.db.sql("""
-        SELECT COUNT(*) FROM (
-            SELECT c.batch_no, SUM(c.qty) as balance FROM (
-                SELECT ri.batch_no, ri.number_of_bags as qty
-                FROM `tabCold Storage Receipt Item` ri
-                JOIN `tabCold Storage Receipt` r ON ri.parent = r.name
-                WHERE r.docstatus = 1
-                
-                UNION ALL
-                
-                SELECT di.batch_no, -di.number_of_bags as qty
-                FROM `tabCold Storage Dispatch Item` di
-                JOIN `tabCold Storage Dispatch` d ON di.parent = d.name
-                WHERE d.docstatus = 1
-            ) c
-            GROUP BY c.batch_no
-            HAVING SUM(c.qty) > 0
-        ) as active_batches
-    """)[0][0]
+	# Read from the materialized batch ledger instead of re-summing history
+	return frappe.db.sql("""
+		SELECT COUNT(*) FROM (
+			SELECT batch_no
+			FROM `tabCold Storage Batch Ledger`
+			GROUP BY batch_no
+			HAVING SUM(balance_qty) > 0
+		) as active_batches
+	""")[0][0]
 
 from frappe.utils import flt, getdate, nowdate
 
@@ -47,114 +41,115 @@ def get_bag_rates(item_group, billing_type, goods_item=None, customer=None, doc_
 	Lookup rates based on Priority:
 	1. Rate Cards (Most specific match by Season/Tier/Date)
 	2. Fallback to global Cold Storage Settings
+	Resolved against the cached rate index (see rate_index.py).
 	Returns: {"handling": rate, "loading": loading_rate}
 	"""
-	from frappe.utils import getdate, nowdate
-	if not doc_date:
-		doc_date = nowdate()
-	
-	doc_date = getdate(doc_date)
-	
+	doc_date = getdate(doc_date or nowdate())
+
 	# Get Customer Tier
 	customer_tier = None
 	if customer:
-		customer_tier = frappe.db.get_value("Customer", customer, "cold_storage_tier")
-	
-	# Find applicable Rate Cards
-	rate_cards = frappe.get_all("Cold Storage Rate Card", 
-		filters={
-			"is_active": 1,
-			"docstatus": ["<", 2]
-		},
-		fields=["name", "priority", "season", "customer_tier", "valid_from", "valid_to"],
-		order_by="priority desc"
-	)
-	
-	for card in rate_cards:
-		if card.season:
-			season_dates = frappe.db.get_value("Cold Storage Season", card.season, ["from_date", "to_date"], as_dict=1)
-			if season_dates and not (getdate(season_dates.from_date) <= doc_date <= getdate(season_dates.to_date)):
-				continue
-		
-		if card.customer_tier and card.customer_tier != customer_tier:
-			continue
-			
-		if card.valid_from and getdate(card.valid_from) > doc_date:
-			continue
-		if card.valid_to and getdate(card.valid_to) < doc_date:
-			continue
-			
-		card_doc = frappe.get_doc("Cold Storage Rate Card", card.name)
-		rates = find_rates_in_table(card_doc.rates, item_group, billing_type, goods_item)
-		if rates:
-			return rates
-			
-	settings = frappe.get_single("Cold Storage Settings")
-	rates = find_rates_in_table(settings.bag_type_rates, item_group, billing_type, goods_item)
-	
+		customer_tier = frappe.get_cached_value("Customer", customer, "cold_storage_tier")
+
+	rates = lookup_rates(get_rate_index(), item_group, billing_type, goods_item, customer_tier, doc_date)
+
 	return rates if rates else {"handling": 0.0, "loading": 0.0}
 
-def find_rates_in_table(rates_table, item_group, billing_type, goods_item=None):
-	# Priority 1: Specific Match
-	for row in rates_table:
-		if row.billing_type == billing_type and row.item_group == item_group:
-			if row.goods_item and row.goods_item == goods_item:
-				return {"handling": flt(row.rate), "loading": flt(row.loading_rate)}
-				 
-	# Priority 2: Generic Match
-	for row in rates_table:
-		if row.billing_type == billing_type and row.item_group == item_group and not row.goods_item:
-			return {"handling": flt(row.rate), "loading": flt(row.loading_rate)}
-			
-	return None
+def get_rate_key(item_group, goods_item=None):
+	return f"{item_group}:{goods_item or ''}"
+
+def get_bag_rates_bulk(customer, doc_date, billing_type, rows):
+	"""
+	Quote rates for a whole document in one pass.
+	`rows` is a list of [item_group, goods_item] pairs or dicts with those keys.
+	Returns: {"<item_group>:<goods_item>": {"handling": rate, "loading": loading_rate}}
+	"""
+	if isinstance(rows, str):
+		rows = json.loads(rows)
+
+	doc_date = getdate(doc_date or nowdate())
+
+	# Fetch the Customer Tier once for the whole document
+	customer_tier = None
+	if customer:
+		customer_tier = frappe.get_cached_value("Customer", customer, "cold_storage_tier")
+
+	index = get_rate_index()
+	quotes = {}
+	for row in rows or []:
+		if isinstance(row, dict):
+			item_group, goods_item = row.get("item_group"), row.get("goods_item")
+		else:
+			item_group, goods_item = row[0], row[1]
+
+		key = get_rate_key(item_group, goods_item)
+		if key in quotes:
+			continue
+
+		rates = lookup_rates(index, item_group, billing_type, goods_item, customer_tier, doc_date)
+		quotes[key] = rates if rates else {"handling": 0.0, "loading": 0.0}
+
+	return quotes
 
 def get_batch_balance(linked_receipt, batch_no, current_dispatch=None):
 	if not linked_receipt or not batch_no:
 		return 0
-	
-	received_qty = frappe.db.get_value("Cold Storage Receipt Item", 
-		filters={"parent": linked_receipt, "batch_no": batch_no}, 
-		fieldname="number_of_bags"
-	) or 0
-	
-	# Check dispatches
-	conditions = "d_item.linked_receipt = %s AND d_item.batch_no = %s AND d.docstatus = 1"
-	values = [linked_receipt, batch_no]
-	
+
+	balances = get_batch_balances([[linked_receipt, batch_no]], current_dispatch)
+	return flt(balances.get(get_ledger_name(linked_receipt, batch_no)))
+
+def get_batch_balances(rows, current_dispatch=None):
+	"""
+	Balances for many (linked_receipt, batch_no) pairs in one round trip.
+	`rows` is a list of [linked_receipt, batch_no] pairs or dicts with those keys.
+	Returns: {"<linked_receipt>:<batch_no>": balance}
+	"""
+	if isinstance(rows, str):
+		rows = json.loads(rows)
+
+	keys = set()
+	for row in rows or []:
+		if isinstance(row, dict):
+			linked_receipt, batch_no = row.get("linked_receipt"), row.get("batch_no")
+		else:
+			linked_receipt, batch_no = row[0], row[1]
+
+		if linked_receipt and batch_no:
+			keys.add(get_ledger_name(linked_receipt, batch_no))
+
+	if not keys:
+		return {}
+
+	balances = {key: 0.0 for key in keys}
+	for name, balance in frappe.db.sql("""
+		SELECT name, balance_qty
+		FROM `tabCold Storage Batch Ledger`
+		WHERE name IN %(keys)s
+	""", {"keys": tuple(keys)}):
+		balances[name] = flt(balance)
+
+	# The ledger already includes submitted dispatches, so add back the
+	# current one when it is being re-validated
 	if current_dispatch:
-		conditions += " AND d.name != %s"
-		values.append(current_dispatch)
-		
-	dispatched_qty = frappe.db.sql(f"""
-		SELECT SUM(d_item.number_of_bags)
-		FROM `tabCold Storage Dispatch` d
-		JOIN `tabCold Storage Dispatch Item` d_item ON d_item.parent = d.name
-		WHERE {conditions}
-	""", tuple(values))[0][0] or 0
-	
-	return flt(received_qty) - flt(dispatched_qty)
+		for linked_receipt, batch_no, qty in frappe.db.sql("""
+			SELECT d_item.linked_receipt, d_item.batch_no, SUM(d_item.number_of_bags)
+			FROM `tabCold Storage Dispatch Item` d_item
+			WHERE d_item.parent = %s AND d_item.docstatus = 1
+			GROUP BY d_item.linked_receipt, d_item.batch_no
+		""", (current_dispatch,)):
+			key = get_ledger_name(linked_receipt, batch_no)
+			if key in balances:
+				balances[key] += flt(qty)
+
+	return balances
 
 def get_total_batch_balance(customer, warehouse, batch_no):
-	# Optimized N+1 fix: Single query aggregation
 	return frappe.db.sql("""
-		SELECT 
-			(
-				SELECT IFNULL(SUM(ri.number_of_bags), 0)
-				FROM `tabCold Storage Receipt` r
-				JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
-				WHERE r.customer = %(customer)s 
-				  AND r.warehouse = %(warehouse)s 
-				  AND ri.batch_no = %(batch_no)s 
-				  AND r.docstatus = 1
-			) - (
-				SELECT IFNULL(SUM(di.number_of_bags), 0)
-				FROM `tabCold Storage Dispatch` d
-				JOIN `tabCold Storage Dispatch Item` di ON di.parent = d.name
-				WHERE d.customer = %(customer)s 
-				  AND di.warehouse = %(warehouse)s 
-				  AND di.batch_no = %(batch_no)s 
-				  AND d.docstatus = 1
-			) as balance
+		SELECT IFNULL(SUM(balance_qty), 0)
+		FROM `tabCold Storage Batch Ledger`
+		WHERE customer = %(customer)s
+		  AND warehouse = %(warehouse)s
+		  AND batch_no = %(batch_no)s
 	""", {
 		"customer": customer,
 		"warehouse": warehouse,
@@ -162,62 +157,8 @@ def get_total_batch_balance(customer, warehouse, batch_no):
 	})[0][0] or 0
 
 
-import requests
-import json
-
-def send_whatsapp(number, message):
-	"""
-	Send WhatsApp message using configured provider settings.
-	"""
-	settings = frappe.get_single("Cold Storage WhatsApp Settings")
-	if not settings.enabled:
-		return
-
-	if not number:
-		frappe.log_error("WhatsApp Error", "No recipient number provided")
-		return
-
-	if settings.provider == "Twilio":
-		send_via_twilio(settings, number, message)
-	else:
-		frappe.log_error("WhatsApp Error", f"Unsupported provider: {settings.provider}")
-
-def send_via_twilio(settings, to_number, message):
-	if not settings.account_sid or not settings.auth_token or not settings.sender_number:
-		frappe.log_error("WhatsApp Error", "Missing Twilio credentials")
-		return
-
-	url = f"https://api.twilio.com/2010-04-01/Accounts/{settings.account_sid}/Messages.json"
-	
-	# Twilio requires whatsapp: prefix
-	if not to_number.startswith("whatsapp:"):
-		to_number = f"whatsapp:{to_number}"
-	
-	from_number = settings.sender_number
-	if not from_number.startswith("whatsapp:"):
-		from_number = f"whatsapp:{from_number}"
-
-	payload = {
-		'From': from_number,
-		'To': to_number,
-		'Body': message
-	}
-
-	try:
-		response = requests.post(
-			url, 
-			data=payload, 
-			auth=(settings.account_sid, settings.auth_token)
-		)
-		
-		if response.status_code not in [200, 201]:
-			frappe.log_error("WhatsApp Twilio Error", f"Status: {response.status_code}, Response: {response.text}")
-		else:
-			# Optional: Log success or store message ID
-			pass
-			
-	except Exception as e:
-		frappe.log_error("WhatsApp Exception", str(e))
+# Re-exported: callers send through utils.send_whatsapp
+from cold_storage.cold_storage.whatsapp import send_whatsapp
 
 @frappe.whitelist()
 def get_total_warehouses_count(filters=None):
@@ -255,12 +196,86 @@ def get_total_outgoing_bills(filters=None):
 	year_start = f"{today.year}-01-01"
 	year_end = f"{today.year}-12-31"
 
-	result = frappe.db.sql("""
-		SELECT SUM(base_net_total)
-		FROM `tabSales Invoice`
-		WHERE company = %s
-		  AND docstatus = 1
-		  AND posting_date BETWEEN %s AND %s
-	""", (default_company, year_start, year_end))
-	
-	return flt(result[0][0]) if result else 0.0
+	from cold_storage.cold_storage.doctype.cold_storage_daily_stat.cold_storage_daily_stat import get_daily_totals
+
+	return get_daily_totals(year_start, year_end, default_company).billed_amount
+
+def get_warehouse_stock():
+	"""
+	Current stock per warehouse from a single GROUP BY (warehouse, item_group)
+	over submitted receipts and dispatches. Used to reconcile the
+	Cold Storage Warehouse Occupancy counters.
+	Returns: {warehouse: {"jute_bags", "net_bags", "total_bags", "equivalent_stock"}}
+	"""
+	rows = frappe.db.sql("""
+		SELECT s.warehouse, s.item_group, SUM(s.qty) as qty
+		FROM (
+			SELECT r.warehouse, ri.item_group, ri.number_of_bags as qty
+			FROM `tabCold Storage Receipt` r
+			JOIN `tabCold Storage Receipt Item` ri ON ri.parent = r.name
+			WHERE r.docstatus = 1
+
+			UNION ALL
+
+			SELECT di.warehouse, di.item_group, -di.number_of_bags as qty
+			FROM `tabCold Storage Dispatch Item` di
+			WHERE di.docstatus = 1
+		) s
+		GROUP BY s.warehouse, s.item_group
+	""", as_dict=True)
+
+	stock = {}
+	for row in rows:
+		w = stock.setdefault(row.warehouse, frappe._dict({"jute_bags": 0, "net_bags": 0, "total_bags": 0}))
+		w.total_bags += flt(row.qty)
+		# Item groups other than Jute/Net do not count towards capacity;
+		# rows without an item group are treated as Jute Bags
+		if row.item_group in ("Jute Bag", None, ""):
+			w.jute_bags += flt(row.qty)
+		elif row.item_group == "Net Bag":
+			w.net_bags += flt(row.qty)
+
+	for w in stock.values():
+		# 2 Net Bags = 1 Jute Bag
+		w.equivalent_stock = flt(w.jute_bags) + (flt(w.net_bags) / 2)
+
+	return stock
+
+@frappe.whitelist()
+def get_warehouse_utilization(warehouse=None):
+	"""
+	Utilization of every warehouse with a capacity, in Jute Bag equivalents.
+	Shared by the Warehouse Utilization report, dashboard chart source and
+	live capacity displays.
+	"""
+	# O(#warehouses) read of the incrementally maintained occupancy counters
+	warehouses = frappe.db.sql(f"""
+		SELECT
+			w.name, w.warehouse_name, w.total_capacity_bags,
+			IFNULL(o.jute_bags, 0) as jute_bags,
+			IFNULL(o.net_bags, 0) as net_bags,
+			IFNULL(o.equivalent_stock, 0) as equivalent_stock
+		FROM `tabWarehouse` w
+		LEFT JOIN `tabCold Storage Warehouse Occupancy` o ON o.name = w.name
+		WHERE w.disabled = 0 AND w.is_group = 0 AND w.total_capacity_bags > 0
+			{"AND w.name = %(warehouse)s" if warehouse else ""}
+		ORDER BY w.warehouse_name
+	""", {"warehouse": warehouse}, as_dict=True)
+
+	data = []
+	for w in warehouses:
+		capacity = flt(w.total_capacity_bags)
+		utilization = (w.equivalent_stock / capacity) * 100
+		available = capacity - w.equivalent_stock
+
+		data.append({
+			"warehouse": w.warehouse_name,
+			"capacity": flt(capacity, 1),
+			"jute_bags": int(w.jute_bags) if w.jute_bags > 0 else 0,
+			"net_bags": int(w.net_bags) if w.net_bags > 0 else 0,
+			"equivalent_stock": flt(w.equivalent_stock, 1),
+			"utilization": flt(utilization, 2),
+			"available": flt(available, 1) if available > 0 else 0
+		})
+
+	return data
@@ -1,5 +1,6 @@
 import frappe
 from cold_storage.cold_storage.api import record_sensor_data
+from cold_storage.cold_storage.sensor_queue import drain_sensor_queue
 import json
 
 def verify():
@@ -22,6 +23,9 @@ def verify():
     print("Simulating sensor record...")
     result = record_sensor_data()
     print(f"API Result: {result}")
+
+    # Readings are queued; persist them as the background drainer would
+    drain_sensor_queue()
     
     # Check if reading was created
     readings = frappe.get_all("Cold Storage Environment Reading", filters={"sensor": "EUI-TEST-001"}, order_by="timestamp desc", limit=1)
@@ -0,0 +1,180 @@
+from collections import deque
+
+import frappe
+from frappe.utils import flt
+
+# (connect, read) seconds; a slow provider must never hold a worker indefinitely
+REQUEST_TIMEOUT = (3.05, 10)
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_SIZE = 10
+
+_session = None
+
+
+def get_session():
+	"""
+	requests.Session shared by every send in this worker process, so TLS
+	connections to the provider are pooled and reused. Retries 429/5xx with
+	exponential backoff, honouring Retry-After.
+	"""
+	global _session
+	if _session is None:
+		import requests
+		from requests.adapters import HTTPAdapter
+		from urllib3.util.retry import Retry
+
+		retry = Retry(
+			total=MAX_RETRIES,
+			connect=MAX_RETRIES,
+			read=0,
+			status=MAX_RETRIES,
+			backoff_factor=BACKOFF_FACTOR,
+			status_forcelist=RETRY_STATUSES,
+			allowed_methods=frozenset(["GET", "POST"]),
+			respect_retry_after_header=True,
+			raise_on_status=False,
+		)
+		adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+		session = requests.Session()
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		_session = session
+	return _session
+
+
+class WhatsAppProvider:
+	"""
+	Base class for WhatsApp providers. Subclasses implement send() and return
+	a result dict: {"status": "Sent" | "Failed", "message_id", "error"}.
+	send() may run in a worker thread, so anything needing the database is
+	read in __init__.
+	Extra providers can be registered by other apps with the
+	`cold_storage_whatsapp_providers` hook: {"Provider Name": "dotted.path.Class"}.
+	"""
+
+	# Default messages per second for the outbound queue, 0 for unlimited
+	rate_limit = 0
+
+	def __init__(self, settings):
+		self.settings = settings
+
+	def get_rate_limit(self):
+		return flt(self.settings.get("max_messages_per_second")) or self.rate_limit
+
+	def send(self, to_number, message):
+		raise NotImplementedError
+
+	@staticmethod
+	def result(status, message_id=None, error=None):
+		return frappe._dict({"status": status, "message_id": message_id, "error": error})
+
+
+class TwilioProvider(WhatsAppProvider):
+	rate_limit = 10
+
+	def __init__(self, settings):
+		super().__init__(settings)
+		self.auth_token = settings.get_password("auth_token", raise_exception=False)
+
+	def send(self, to_number, message):
+		settings = self.settings
+		auth_token = self.auth_token
+		if not settings.account_sid or not auth_token or not settings.sender_number:
+			return self.result("Failed", error="Missing Twilio credentials")
+
+		url = f"https://api.twilio.com/2010-04-01/Accounts/{settings.account_sid}/Messages.json"
+
+		# Twilio requires whatsapp: prefix
+		if not to_number.startswith("whatsapp:"):
+			to_number = f"whatsapp:{to_number}"
+
+		from_number = settings.sender_number
+		if not from_number.startswith("whatsapp:"):
+			from_number = f"whatsapp:{from_number}"
+
+		payload = {
+			'From': from_number,
+			'To': to_number,
+			'Body': message
+		}
+
+		try:
+			response = get_session().post(
+				url,
+				data=payload,
+				auth=(settings.account_sid, auth_token),
+				timeout=REQUEST_TIMEOUT
+			)
+		except Exception as e:
+			return self.result("Failed", error=str(e))
+
+		if response.status_code not in [200, 201]:
+			return self.result("Failed", error=f"Status: {response.status_code}, Response: {response.text}")
+
+		try:
+			message_id = response.json().get("sid")
+		except ValueError:
+			message_id = None
+		return self.result("Sent", message_id=message_id)
+
+
+class StubProvider(WhatsAppProvider):
+	"""
+	Accepts every message without any network call; for tests and load runs.
+	Only the latest messages are kept in `sent`, so long runs stay bounded.
+	"""
+
+	sent = deque(maxlen=1000)
+
+	def send(self, to_number, message):
+		message_id = f"stub-{frappe.generate_hash(length=12)}"
+		StubProvider.sent.append(frappe._dict({"to": to_number, "message": message, "message_id": message_id}))
+		return self.result("Sent", message_id=message_id)
+
+
+PROVIDERS = {
+	"Twilio": TwilioProvider,
+	"Stub": StubProvider,
+}
+
+def get_provider(settings=None):
+	settings = settings or frappe.get_cached_doc("Cold Storage WhatsApp Settings")
+
+	provider_class = PROVIDERS.get(settings.provider)
+	if not provider_class:
+		hooks = frappe.get_hooks("cold_storage_whatsapp_providers").get(settings.provider)
+		if hooks:
+			provider_class = frappe.get_attr(hooks[-1])
+
+	if not provider_class:
+		frappe.throw(f"Unsupported WhatsApp provider: {settings.provider}")
+
+	return provider_class(settings)
+
+
+def send_whatsapp(number, message):
+	"""
+	Send WhatsApp message using configured provider settings.
+	Returns the provider result, or None if WhatsApp is disabled.
+	"""
+	settings = frappe.get_cached_doc("Cold Storage WhatsApp Settings")
+	if not settings.enabled:
+		return
+
+	if not number:
+		frappe.log_error("WhatsApp Error", "No recipient number provided")
+		return
+
+	try:
+		provider = get_provider(settings)
+	except frappe.ValidationError as e:
+		frappe.log_error("WhatsApp Error", str(e))
+		return
+
+	result = provider.send(number, message)
+	if result.status != "Sent":
+		frappe.log_error(f"WhatsApp {settings.provider} Error", result.error)
+	return result
@@ -0,0 +1,69 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-batch-ledger")
+@pass_context
+def rebuild_batch_ledger(context):
+	"""Recompute Cold Storage Batch Ledger from submitted Receipts and Dispatches"""
+	import frappe
+	from cold_storage.cold_storage.doctype.cold_storage_batch_ledger.cold_storage_batch_ledger import (
+		rebuild_batch_ledger as rebuild,
+	)
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		count = rebuild()
+		frappe.db.commit()
+		click.echo(f"Rebuilt Cold Storage Batch Ledger: {count} rows")
+	finally:
+		frappe.destroy()
+
+
+@click.command("rebuild-environment-rollups")
+@click.option("--from-date", help="Only rebuild buckets from this date (YYYY-MM-DD)")
+@click.option("--to-date", help="Only rebuild buckets up to this date (YYYY-MM-DD)")
+@pass_context
+def rebuild_environment_rollups(context, from_date=None, to_date=None):
+	"""Recompute the minute/hour/day Environment Rollups from raw readings"""
+	import frappe
+	from cold_storage.cold_storage.doctype.cold_storage_environment_rollup.cold_storage_environment_rollup import (
+		rebuild_environment_rollups as rebuild,
+	)
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		count = rebuild(from_date, to_date)
+		frappe.db.commit()
+		click.echo(f"Rebuilt Cold Storage Environment Rollups: {count} rows")
+	finally:
+		frappe.destroy()
+
+
+@click.command("rebuild-daily-stats")
+@click.option("--from-date", help="Only rebuild stats from this date (YYYY-MM-DD)")
+@click.option("--to-date", help="Only rebuild stats up to this date (YYYY-MM-DD)")
+@pass_context
+def rebuild_daily_stats(context, from_date=None, to_date=None):
+	"""Recompute Cold Storage Daily Stats from submitted Receipts, Dispatches and Sales Invoices"""
+	import frappe
+	from cold_storage.cold_storage.doctype.cold_storage_daily_stat.cold_storage_daily_stat import (
+		rebuild_daily_stats as rebuild,
+	)
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		count = rebuild(from_date, to_date)
+		frappe.db.commit()
+		click.echo(f"Rebuilt Cold Storage Daily Stats: {count} rows")
+	finally:
+		frappe.destroy()
+
+
+commands = [rebuild_batch_ledger, rebuild_environment_rollups, rebuild_daily_stats]
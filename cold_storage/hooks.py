@@ -134,10 +134,28 @@ app_include_js = "/assets/cold_storage/js/cold_storage_notifications.js"
 
 doc_events = {
     "Cold Storage Receipt": {
-        "after_insert": "cold_storage.workflow.auto_request_approval"
+        "after_insert": "cold_storage.workflow.auto_request_approval",
+        "on_submit": "cold_storage.cold_storage.api.customer_portal.clear_customer_statement_cache",
+        "on_cancel": "cold_storage.cold_storage.api.customer_portal.clear_customer_statement_cache"
     },
     "Cold Storage Dispatch": {
-        "after_insert": "cold_storage.workflow.auto_request_approval"
+        "after_insert": "cold_storage.workflow.auto_request_approval",
+        "on_submit": "cold_storage.cold_storage.api.customer_portal.clear_customer_statement_cache",
+        "on_cancel": "cold_storage.cold_storage.api.customer_portal.clear_customer_statement_cache"
+    },
+    "Sales Invoice": {
+        "on_submit": [
+            "cold_storage.cold_storage.doctype.cold_storage_daily_stat.cold_storage_daily_stat.update_daily_stat_for_invoice",
+            "cold_storage.cold_storage.api.customer_portal.clear_customer_statement_cache"
+        ],
+        "on_cancel": [
+            "cold_storage.cold_storage.doctype.cold_storage_daily_stat.cold_storage_daily_stat.update_daily_stat_for_invoice",
+            "cold_storage.cold_storage.api.customer_portal.clear_customer_statement_cache"
+        ]
+    },
+    "Payment Entry": {
+        "on_submit": "cold_storage.cold_storage.api.customer_portal.clear_customer_statement_cache",
+        "on_cancel": "cold_storage.cold_storage.api.customer_portal.clear_customer_statement_cache"
     }
 }
 
@@ -146,9 +164,19 @@ doc_events = {
 # ---------------
 
 scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"cold_storage.cold_storage.sensor_queue.drain_sensor_queue",
+			"cold_storage.cold_storage.doctype.cold_storage_outbound_message.cold_storage_outbound_message.drain_outbound_messages"
+		]
+	},
 	"daily": [
 		"cold_storage.cold_storage.tasks.send_daily_summary",
-		"cold_storage.cold_storage.tasks.send_late_payment_reminders"
+		"cold_storage.cold_storage.tasks.send_late_payment_reminders",
+		"cold_storage.cold_storage.doctype.cold_storage_warehouse_occupancy.cold_storage_warehouse_occupancy.reconcile_warehouse_occupancy"
+	],
+	"daily_long": [
+		"cold_storage.cold_storage.environment_retention.apply_environment_retention"
 	],
 }
 
@@ -251,6 +279,7 @@ fixtures = [
         "filters": [["name", "in", [
             "Item-allow_zero_valuation_rate",
             "Customer-cold_storage_tier",
+            "Customer-cold_storage_last_payment_reminder",
             "Warehouse-total_capacity_bags"
         ]]]
     },
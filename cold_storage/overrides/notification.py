@@ -1,7 +1,7 @@
 
 import frappe
 from frappe.email.doctype.notification.notification import Notification
-from cold_storage.cold_storage.utils import send_whatsapp
+from cold_storage.cold_storage.doctype.cold_storage_outbound_message.cold_storage_outbound_message import enqueue_whatsapp_bulk
 
 class CustomNotification(Notification):
     def send_notification_by_channel(self, doc, context):
@@ -21,10 +21,12 @@ class CustomNotification(Notification):
         if not receiver_list:
             return
 
-        for mobile in receiver_list:
-            if mobile:
-                try:
-                    send_whatsapp(mobile, message)
-                    frappe.msgprint(f"WhatsApp sent to {mobile}")
-                except Exception as e:
-                    self.log_error(f"WhatsApp Failure: {str(e)}")
+        try:
+            queued = enqueue_whatsapp_bulk([
+                {"recipient": mobile, "message": message, "reference_doctype": doc.doctype, "reference_name": doc.name}
+                for mobile in receiver_list if mobile
+            ])
+            if queued:
+                frappe.msgprint(f"WhatsApp queued for {', '.join(m for m in receiver_list if m)}")
+        except Exception as e:
+            self.log_error(f"WhatsApp Failure: {str(e)}")
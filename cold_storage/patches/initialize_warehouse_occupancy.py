@@ -0,0 +1,7 @@
+import frappe
+
+from cold_storage.cold_storage.doctype.cold_storage_warehouse_occupancy.cold_storage_warehouse_occupancy import reconcile_warehouse_occupancy
+
+def execute():
+	# Seed the occupancy counters from existing history
+	reconcile_warehouse_occupancy(log_drift=False)
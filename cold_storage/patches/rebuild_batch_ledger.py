@@ -0,0 +1,7 @@
+import frappe
+
+from cold_storage.cold_storage.doctype.cold_storage_batch_ledger.cold_storage_batch_ledger import rebuild_batch_ledger
+
+def execute():
+	# Populate the ledger from existing history on sites installed before it existed
+	rebuild_batch_ledger()
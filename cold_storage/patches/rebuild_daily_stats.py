@@ -0,0 +1,7 @@
+import frappe
+
+from cold_storage.cold_storage.doctype.cold_storage_daily_stat.cold_storage_daily_stat import rebuild_daily_stats
+
+def execute():
+	# Backfill the stats from documents submitted before the table existed
+	rebuild_daily_stats()
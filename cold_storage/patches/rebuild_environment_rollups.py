@@ -0,0 +1,9 @@
+import frappe
+
+from cold_storage.cold_storage.doctype.cold_storage_environment_rollup.cold_storage_environment_rollup import (
+	rebuild_environment_rollups,
+)
+
+def execute():
+	# Roll up readings recorded before the rollup tables existed
+	rebuild_environment_rollups()